@@ -43,6 +43,7 @@
  #define REG_HEADER_DATA_HIGH 0x0F8  // High 32 bits of 64-bit header word
  #define REG_HEADER_ADDR      0x0FC  // Word address (0-271 for 2176 bytes)
  #define REG_HEADER_WE        0x100  // Write enable
+ #define REG_DEBUG_ENABLE     0x104  // Enable debug block capture
  
  #define STATUS_IDLE    (1 << 0)
  #define STATUS_RUNNING (1 << 1)
@@ -220,6 +221,8 @@ void run_clz_test(int target_clz, uint64_t timeout_cycles, uint64_t attempt_limi
      regs[REG_ATTEMPT_LIMIT / 4]     = (uint32_t)(attempt_limit >> 32);
      regs[REG_ATTEMPT_LIMIT / 4 + 1] = (uint32_t)(attempt_limit & 0xFFFFFFFF);
      
+     regs[REG_DEBUG_ENABLE / 4] = debug_enabled ? 1 : 0;
+     
      __sync_synchronize();
  
      /* 4. Start */
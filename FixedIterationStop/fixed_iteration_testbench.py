@@ -104,6 +104,7 @@ def test_fixed_iteration():
         yield dut._input_len.storage.eq(input_len)
         yield dut._target_clz.storage.eq(64)  # Set target_clz to 64 so that CLZ=0 doesn't trigger immediately
         yield dut._timeout.storage.eq(0) # Disable HW timeout for this test
+        yield dut._debug_enable.storage.eq(1) # Capture debug_block0_data (block 0 of each attempt) for the report
         yield
         
         # 2. Wait for Idle
@@ -24,6 +24,7 @@
 #define REG_HEADER_WE        0x0F8  // Write enable
 // NOTE: Update this offset from csr.json after rebuilding gateware!
 #define REG_DEBUG_BLOCK0     0x0A0  // Debug: First 64 bytes of block 0 (16 words = 64 bytes)
+#define REG_DEBUG_ENABLE     0x104  // Debug: Capture enable for REG_DEBUG_BLOCK0 (off = no capture)
 
 #define STATUS_IDLE    (1 << 0)
 #define STATUS_RUNNING (1 << 1)
@@ -156,6 +157,9 @@ void run_iteration_test() {
     // Disable timeout (64-bit register, write both words)
     regs[REG_TIMEOUT / 4]     = 0;  // High word
     regs[REG_TIMEOUT / 4 + 1] = 0;  // Low word
+    // Debug block capture is off by default; enable it so REG_DEBUG_BLOCK0
+    // holds block 0 (with nonce) of the last attempt for the report below
+    regs[REG_DEBUG_ENABLE / 4] = 1;
     __sync_synchronize();
 
     /* 4. Start Accelerator */
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+"""
+Datapath Configuration Test
+
+Runs the multi-block hash validity test (test_multiblock_processing.py) on
+every KeccakDatapath build option, so each option's hash is checked against
+hashlib.sha3_256 and not only the default build.
+
+Usage:
+    python3 test_datapath_configurations.py [input_size] [target_clz]
+
+    input_size: Input data size in bytes (default: 300, max: 2175)
+    target_clz:  Target leading zeros (default: 3, so a few attempts run
+                 and lanes other than lane 0 can win)
+"""
+
+import sys
+from pathlib import Path
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from test_multiblock_processing import test_multiblock_processing
+
+# (name, KeccakDatapath keyword arguments). FIXED_INPUT_LENGTH is filled in
+# with the input size of the run.
+CONFIGS = [
+    ("default",              {}),
+    ("TIME_MUX",             {"TIME_MUX": True}),
+    ("ROUNDS_PER_CYCLE=2",   {"ROUNDS_PER_CYCLE": 2}),
+    ("PIPELINE_DEPTH=2",     {"PIPELINE_DEPTH": 2}),
+    ("FIXED_INPUT_LENGTH",   {"FIXED_INPUT_LENGTH": None}),
+    ("NUM_LANES=4",          {"NUM_LANES": 4}),
+    ("NUM_LANES=3 TIME_MUX", {"NUM_LANES": 3, "TIME_MUX": True}),
+]
+
+def test_datapath_configurations(input_size=300, target_clz=3):
+    results = []
+    for name, config in CONFIGS:
+        config = dict(config)
+        if "FIXED_INPUT_LENGTH" in config:
+            config["FIXED_INPUT_LENGTH"] = input_size
+        print(f"\n### Configuration: {name}")
+        passed = test_multiblock_processing(input_size, target_clz, vcd_name=None, **config)
+        results.append((name, passed))
+
+    print("\n" + "="*70)
+    print("Configuration Summary")
+    print("="*70)
+    for name, passed in results:
+        print(f"  {name:<22} {'[PASS] ✓' if passed else '[FAIL] ✗'}")
+    print("="*70)
+    return all(passed for _, passed in results)
+
+if __name__ == "__main__":
+    # Parse command line arguments
+    input_size = 300  # Default
+    target_clz = 3     # Default
+
+    if len(sys.argv) >= 2:
+        try:
+            input_size = int(sys.argv[1])
+            if input_size < 1 or input_size > 2175:
+                print(f"ERROR: input_size must be between 1 and 2175 bytes")
+                sys.exit(1)
+        except ValueError:
+            print(f"ERROR: Invalid input_size format")
+            sys.exit(1)
+
+    if len(sys.argv) >= 3:
+        try:
+            target_clz = int(sys.argv[2])
+            if target_clz < 0 or target_clz > 256:
+                print(f"ERROR: target_clz must be between 0 and 256")
+                sys.exit(1)
+        except ValueError:
+            print(f"ERROR: Invalid target_clz format")
+            sys.exit(1)
+
+    sys.exit(0 if test_datapath_configurations(input_size, target_clz) else 1)
@@ -6,6 +6,12 @@ Multi-Block Processing Test (Updated for CLZ)
 Tests:
 1. Hash validity for multi-block inputs (configurable size)
 
+The datapath reads the header one 1088-bit block at a time (header_data is
+the BRAM output for block_addr, one cycle of read latency). The testbench
+models that BRAM, so any KeccakDatapath configuration can be checked:
+test_multiblock_processing(..., **config) passes config to the datapath
+(see test_datapath_configurations.py).
+
 Usage:
     python3 test_multiblock_processing.py [input_size] [target_clz]
     
@@ -19,18 +25,45 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from migen import *
-from migen.sim import run_simulation
+from migen.sim import run_simulation, passive
 from keccak_datapath_simd import KeccakDatapath
 import hashlib
 
-def test_multiblock_processing(input_size=300, target_clz=0):
+def test_multiblock_processing(input_size=300, target_clz=0, vcd_name=None, **config):
     print("="*70)
     print("Multi-Block Processing Test Suite")
     print("="*70)
     print(f"Input Size:  {input_size} bytes")
     print(f"Target CLZ:  {target_clz} leading zeros")
+    if config:
+        print(f"Config:      {', '.join(f'{k}={v}' for k, v in config.items())}")
+    
+    dut = KeccakDatapath(MAX_BLOCKS=16, MAX_DIFFICULTY_BITS=256, **config)
+    result = {"passed": False}
+    
+    # 1. Setup Input Data
+    test_input_bytes = bytearray()
+    pattern = bytes([0x11, 0x22, 0x33, 0x44, 0x55, 0x66, 0x77, 0x88])
+    for i in range(input_size):
+        test_input_bytes.append(pattern[i % len(pattern)])
     
-    dut = KeccakDatapath(MAX_BLOCKS=16, MAX_DIFFICULTY_BITS=256)
+    # Set nonce field structure (matching C test)
+    test_input_bytes[0] = 1   # Scale field
+    test_input_bytes[1] = 32  # Length field
+    for i in range(2, 34):    # Clear Nonce field (bytes 2-33)
+        test_input_bytes[i] = 0
+    
+    # 2. Split into 136-byte blocks, loaded as LITTLE ENDIAN (header BRAM contents)
+    EXPECTED_BLOCKS = (len(test_input_bytes) // 136) + 1
+    header_blocks = [int.from_bytes(test_input_bytes[b*136:(b+1)*136], 'little') for b in range(16)]
+
+    @passive
+    def header_bram():
+        # Synchronous read: header_data shows the block addressed in the previous cycle
+        while True:
+            block_addr = yield dut.block_addr
+            yield dut.header_data.eq(header_blocks[block_addr])
+            yield
 
     def generator():
         # ======================================================================
@@ -40,29 +73,15 @@ def test_multiblock_processing(input_size=300, target_clz=0):
         print(f"[TEST] Hash Validity Test ({input_size} Bytes)")
         print("="*70)
         
-        # 1. Setup Input Data
-        test_input_bytes = bytearray()
-        pattern = bytes([0x11, 0x22, 0x33, 0x44, 0x55, 0x66, 0x77, 0x88])
-        for i in range(input_size):
-            test_input_bytes.append(pattern[i % len(pattern)])
-        
-        # Set nonce field structure (matching C test)
-        test_input_bytes[0] = 1   # Scale field
-        test_input_bytes[1] = 32  # Length field
-        for i in range(2, 34):    # Clear Nonce field (bytes 2-33)
-            test_input_bytes[i] = 0
-        
-        # 2. Load as LITTLE ENDIAN
-        test_input = int.from_bytes(test_input_bytes, 'little')
-        
-        EXPECTED_BLOCKS = (len(test_input_bytes) // 136) + 1
         print(f"  Input Size: {len(test_input_bytes)} bytes")
         print(f"  Expected Blocks: {EXPECTED_BLOCKS}")
         print(f"  Target CLZ: {target_clz}")
 
         yield dut.input_length.eq(input_size)
         yield dut.target_clz.eq(target_clz)
-        yield dut.header_data.eq(test_input)
+        # Let the BRAM model present block 0 before starting
+        yield
+        yield
 
         yield dut.start.eq(1)
         yield
@@ -80,8 +99,9 @@ def test_multiblock_processing(input_size=300, target_clz=0):
             found_status = yield dut.found
             
             if found_status != 0 and not verified:
-                winning_core = 0 if found_status == 1 else 1
-                state_full = yield dut.state_0 if found_status == 1 else dut.state_1
+                # found is one-hot: bit i = lane i
+                winning_core = found_status.bit_length() - 1
+                state_full = yield dut.states[winning_core]
                 
                 # Extract SHA3-256 (Bottom 256 bits of state)
                 HASH_BITS = 256
@@ -92,8 +112,10 @@ def test_multiblock_processing(input_size=300, target_clz=0):
                 
                 print(f"\n  [Cycle {cycle_count}] Hash 'Found' (Core {winning_core}). Verifying...")
                 
-                # Reconstruct expected data
-                current_nonce = yield dut.nonce_0 if found_status == 1 else dut.nonce_1
+                # Reconstruct expected data. The exit does not commit the next
+                # nonces, so the winning lane still holds the nonce it hashed.
+                current_nonce = yield dut.nonces[winning_core]
+                nonce_result = yield dut.nonce_result
                 expected_data = bytearray(test_input_bytes)
                 nonce_bytes = current_nonce.to_bytes(30, byteorder='little')
                 expected_data[4:34] = nonce_bytes
@@ -105,33 +127,38 @@ def test_multiblock_processing(input_size=300, target_clz=0):
                 expected_hash_lib_int = int.from_bytes(expected_hash_lib, byteorder='big')
                 
                 # Get CLZ values
-                clz_0 = yield dut.clz_0_out
-                clz_1 = yield dut.clz_1_out
-                winning_clz = clz_0 if found_status == 1 else clz_1
+                clz_values = []
+                for i in range(dut.NUM_LANES):
+                    clz_values.append((yield dut.clz_outs[i]))
+                winning_clz = clz_values[winning_core]
                 
                 # Display nonce in little-endian byte order (matches C test and hardware)
-                nonce_bytes_le = current_nonce.to_bytes(30, byteorder='little')
-                nonce_hex_le = ''.join(f'{b:02X}' for b in nonce_bytes_le)
+                nonce_hex_le = ''.join(f'{b:02X}' for b in nonce_bytes)
                 
                 print(f"    Nonce (LE):    0x{nonce_hex_le}")
                 print(f"    Expected (BE): 0x{expected_hash_lib_int:064X}")
                 print(f"    Actual   (HW): 0x{hw_hash_be:064X}")
-                print(f"    Core 0 CLZ: {clz_0}")
-                print(f"    Core 1 CLZ: {clz_1}")
+                for i, clz in enumerate(clz_values):
+                    print(f"    Core {i} CLZ: {clz}")
                 print(f"    Winner CLZ: {winning_clz}")
                 
                 # Verify hash matches (compare big-endian representations)
                 hash_match = (hw_hash_be == expected_hash_lib_int)
                 clz_sufficient = (winning_clz >= target_clz)
+                # nonce_result = header bytes 2-3, then the winning nonce
+                nonce_result_match = (nonce_result >> 16) == current_nonce
                 
-                if hash_match and clz_sufficient:
+                if hash_match and clz_sufficient and nonce_result_match:
                     print(f"    [PASS] ✓ Hash matches and CLZ >= {target_clz}!")
+                    result["passed"] = True
                 elif not hash_match:
                     print(f"    [FAIL] ✗ Hash mismatch!")
                     diff_bits = hw_hash_be ^ expected_hash_lib_int
                     print(f"    XOR (difference): 0x{diff_bits:064X}")
                 elif not clz_sufficient:
                     print(f"    [FAIL] ✗ CLZ={winning_clz} < target={target_clz}!")
+                else:
+                    print(f"    [FAIL] ✗ nonce_result doesn't hold the winning nonce!")
                 
                 verified = True
                 break 
@@ -155,7 +182,8 @@ def test_multiblock_processing(input_size=300, target_clz=0):
         print("Test Complete!")
         print("="*70)
 
-    run_simulation(dut, generator(), vcd_name="multiblock_processing.vcd")
+    run_simulation(dut, [generator(), header_bram()], vcd_name=vcd_name)
+    return result["passed"]
 
 if __name__ == "__main__":
     # Parse command line arguments
@@ -188,4 +216,4 @@ if __name__ == "__main__":
     print(f"  target_clz: 0-256 leading zeros (default: 0)")
     print()
     
-    test_multiblock_processing(input_size, target_clz)
+    test_multiblock_processing(input_size, target_clz, vcd_name="multiblock_processing.vcd")
@@ -204,6 +204,7 @@ def test_csr_mode(input_size=100, target_clz=0):
         yield dut._input_len.storage.eq(len(test_input_bytes))
         yield dut._target_clz.storage.eq(target_clz)
         yield dut._timeout.storage.eq(timeout_cycles)
+        yield dut._debug_enable.storage.eq(1)  # Capture debug_block0_data for the monitor below
         yield
         
         # 4. Wait for Idle
@@ -222,11 +223,15 @@ def test_csr_mode(input_size=100, target_clz=0):
         cycle_count = 0
         verified = False
         last_debug_block_data = None
-        block_iteration = 0
-        debug_read_interval = 25  # Read every ~25 cycles (covers ABSORB + some PERMUTE cycles)
+        attempt_captures = 0
+        MAX_ATTEMPT_CAPTURES = 3  # Only print the first few attempts
+        debug_read_interval = 25  # Read every ~25 cycles (at most one attempt per read)
         
-        print(f"\n  [DEBUG] Monitoring block data for each iteration...")
-        print(f"  Expected blocks: {EXPECTED_BLOCKS}")
+        # debug_block0_data only captures block 0 (padded, lane 0 nonce injected),
+        # once per attempt, and only while _debug_enable is set. Blocks 1..N are
+        # not captured, so a change in the register marks a new attempt.
+        print(f"\n  [DEBUG] Monitoring block 0 data for each attempt...")
+        print(f"  Expected blocks: {EXPECTED_BLOCKS} (only block 0 is captured)")
         
         while True:
             status = yield dut._status.status
@@ -236,39 +241,34 @@ def test_csr_mode(input_size=100, target_clz=0):
             
             cycle_count += 1
             
-            # Read debug_block0_data periodically while running to capture each block
+            # Read debug_block0_data periodically while running to capture block 0 of each attempt
             if running and cycle_count % debug_read_interval == 0:
                 debug_block_data = yield dut._debug_block0_data.status
                 
-                # Check if this is a new block (data changed)
+                # Check if this is a new attempt (nonce changed)
                 if debug_block_data != last_debug_block_data:
-                    block_iteration += 1
+                    attempt_captures += 1
                     last_debug_block_data = debug_block_data
                     
                     # Convert to bytes for display
                     block_bytes = debug_block_data.to_bytes(64, 'little')
                     
-                    # Determine if this is Block 0 (has nonce) or subsequent block
-                    # Block 0 will have non-zero bytes in the nonce area (bytes 4-33)
-                    # Note: This is a heuristic - Block 0 has nonce injected, others don't
-                    is_block_0 = (block_iteration == 1) or any(block_bytes[4:34])
-                    block_num = block_iteration - 1
-                    
-                    print(f"\n  [Block {block_num} @ Cycle {cycle_count}] First 64 bytes:")
+                    print(f"\n  [Block 0 @ Cycle {cycle_count}] First 64 bytes (capture {attempt_captures}):")
                     print(f"    Bytes 0-15:   {' '.join(f'{b:02X}' for b in block_bytes[0:16])}")
                     print(f"    Bytes 16-31:  {' '.join(f'{b:02X}' for b in block_bytes[16:32])}")
                     print(f"    Bytes 32-47:  {' '.join(f'{b:02X}' for b in block_bytes[32:48])}")
                     print(f"    Bytes 48-63:  {' '.join(f'{b:02X}' for b in block_bytes[48:64])}")
+                    print(f"    Nonce bytes (4-33): {' '.join(f'{b:02X}' for b in block_bytes[4:34])}")
                     
-                    if block_num == 0:
-                        print(f"    [Block 0] Nonce area (bytes 4-33) contains nonce data")
-                        print(f"    Nonce bytes (4-33): {' '.join(f'{b:02X}' for b in block_bytes[4:34])}")
-                    else:
-                        print(f"    [Block {block_num}] Raw block data (no nonce injection)")
+                    # Outside the nonce the capture must match the header
+                    # (the pad bytes only show up here for inputs under 64 bytes)
+                    header_end = min(64, len(test_input_bytes))
+                    if block_bytes[0:4] != bytes(test_input_bytes[0:4]) or block_bytes[34:header_end] != bytes(test_input_bytes[34:header_end]):
+                        print(f"    [Block 0] ✗ Header bytes outside the nonce don't match the input")
                     
-                    # Stop reading after all expected blocks
-                    if block_iteration >= EXPECTED_BLOCKS:
-                        debug_read_interval = 10000  # Reduce frequency after initial blocks
+                    # Stop reading after the first few attempts
+                    if attempt_captures >= MAX_ATTEMPT_CAPTURES:
+                        debug_read_interval = 10000  # Reduce frequency after the first attempts
             
             if timeout:
                 print(f"\n  [TIMEOUT] Simulation ran too long ({cycle_count} cycles).")
@@ -281,11 +281,11 @@ def test_csr_mode(input_size=100, target_clz=0):
                 print(f"\n  [Cycle {cycle_count}] Hash 'Found'. Verifying...")
                 yield  # Stabilization
                 
-                # Read final block data before verification
+                # Read block 0 of the winning attempt before verification
                 final_debug_block_data = yield dut._debug_block0_data.status
                 if final_debug_block_data != last_debug_block_data:
                     block_bytes = final_debug_block_data.to_bytes(64, 'little')
-                    print(f"\n  [Final Block Data @ Cycle {cycle_count}] First 64 bytes:")
+                    print(f"\n  [Final Block 0 Data @ Cycle {cycle_count}] First 64 bytes:")
                     print(f"    Bytes 0-15:   {' '.join(f'{b:02X}' for b in block_bytes[0:16])}")
                     print(f"    Bytes 16-31:  {' '.join(f'{b:02X}' for b in block_bytes[16:32])}")
                 
@@ -174,10 +174,19 @@ def perform_dma_transfer(dut, base_addr, length_bytes):
         yield
     raise TimeoutError("DMA Transfer Timed Out")
 
-def memory_model_dma_source(dut, memory_data, base_address):
+def read_header_mem(dut, length_bytes):
+    """Reads the header memory back as bytes (16 rows of 17 64-bit words)."""
+    header_bytes = bytearray()
+    for row in range(16):
+        row_value = yield dut.header_mem[row]
+        header_bytes += row_value.to_bytes(17 * WORD_BYTES, 'little')
+    return header_bytes[:length_bytes]
+
+def memory_model_dma_source(dut, memory_data, base_address, beat_bytes=WORD_BYTES):
     """
     Synchronous Wishbone Memory Model (1-cycle latency).
     Returns data in LITTLE-ENDIAN byte order to match CSR formatting.
+    beat_bytes is the bus width in bytes (dma_data_width / 8).
     """
     yield dut.bus.ack.eq(0)
     yield dut.bus.dat_r.eq(0)
@@ -198,16 +207,16 @@ def memory_model_dma_source(dut, memory_data, base_address):
         elif stb and cyc and not we:
             # LiteX Wishbone DMA Reader outputs Word Address.
             # Convert WB word address to Byte Address.
-            byte_addr = adr * WORD_BYTES
+            byte_addr = adr * beat_bytes
             
             if base_address <= byte_addr < (base_address + len(memory_data)):
                 offset = byte_addr - base_address
                 word_data = 0
                 # Pack bytes in big-endian order (MSB first) to match WishboneDMAReader byte swap
                 # The DMA reader with endianness="little" swaps bytes, so we pack in reverse order
-                for i in range(8):
+                for i in range(beat_bytes):
                     if offset + i < len(memory_data):
-                        word_data |= (memory_data[offset + i] << ((7 - i) * 8))
+                        word_data |= (memory_data[offset + i] << ((beat_bytes - 1 - i) * 8))
                 next_data = word_data
             else:
                 next_data = 0 
@@ -245,13 +254,8 @@ def test_dma_mode():
         for _ in range(10): yield
         
         # Read and display header memory contents
-        header_data_full = yield dut.miner.header_data
-        # Extract bytes manually to avoid integer overflow
-        # header_data is 2176 bytes, but we only wrote len(input_bytes)
-        header_bytes = bytearray()
-        for i in range(len(input_bytes)):
-            byte_val = (header_data_full >> (i * 8)) & 0xFF
-            header_bytes.append(byte_val)
+        # (the miner's header_data only shows the block at block_addr)
+        header_bytes = yield from read_header_mem(dut, len(input_bytes))
         
         print(f"  {Colors.CYAN}[Header Memory]{Colors.ENDC} First 16 bytes: {header_bytes[:16].hex()}")
         print(f"  {Colors.CYAN}[Header Memory]{Colors.ENDC} Expected first 16: {bytes(input_bytes[:16]).hex()}")
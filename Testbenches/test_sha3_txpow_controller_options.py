@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+
+"""
+SHA3 TxPoW Controller Options Test
+
+Description:
+    Tests the optional controller features. Each test loads a header the way
+    the option intends, checks the header memory contents and then mines
+    with target_clz=0 and verifies the hash (same checks as the CSR and DMA
+    tests).
+
+Tests:
+    1. with_dma_start_addr: A DMA transfer starting at _dma_start_addr only
+       rewrites its own words; the rest of the header is left alone.
+    2. with_header_bus: Header loaded through the Wishbone header window,
+       then a partial store (sel) that must only change its own bytes.
+    3. with_rate_counter: _rate_out reports the attempts made per
+       _rate_window cycles.
+    4. header_stream: Header loaded with one _header_data write per word
+       after a single _header_addr write.
+    5. dma_data_width=256: _done only means every read was issued; the
+       header is checked once the FIFO has drained, and a start issued
+       right after _done must still hash the complete header.
+
+Usage:
+    python3 test_sha3_txpow_controller_options.py
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from migen import *
+from migen.sim import run_simulation, passive
+from sha3_txpow_controller import SHA3TxPoWController
+from sha3_txpow_controller import WORD_BYTES
+
+from test_sha3_txpow_controller_csr import generate_byte_array, write_header_via_csr, verify_hardware_state
+from test_sha3_txpow_controller_dma import perform_dma_transfer, memory_model_dma_source, read_header_mem
+
+DMA_BASE_ADDR  = 0x10000000
+RAM_SIZE_BYTES = 8192
+TIMEOUT_CYCLES = 5000
+
+# ==============================================================================
+# Helper Generators
+# ==============================================================================
+
+@passive
+def dma_memory(dut, memory_data, base_address, beat_bytes=WORD_BYTES):
+    """The DMA test's memory model, passive so the simulation ends with the test."""
+    yield from memory_model_dma_source(dut, memory_data, base_address, beat_bytes)
+
+def wait_dma_words(dut, end_word, max_cycles=1000):
+    """Waits until the DMA write pointer reaches end_word (header written)."""
+    for i in range(max_cycles):
+        if (yield dut.dma_write_addr) == end_word:
+            return i
+        yield
+    raise TimeoutError("DMA words did not drain")
+
+def check_header_mem(dut, expected_bytes, label):
+    """Compares the header memory with expected_bytes, word by word."""
+    header_bytes = yield from read_header_mem(dut, len(expected_bytes))
+    bad_words = [w for w in range(0, len(expected_bytes), WORD_BYTES)
+        if header_bytes[w:w + WORD_BYTES] != expected_bytes[w:w + WORD_BYTES]]
+    if not bad_words:
+        print(f"    [PASS] ✓ {label}: header memory matches")
+        return True
+    print(f"    [FAIL] ✗ {label}: header words {[w // WORD_BYTES for w in bad_words]} don't match")
+    return False
+
+def mine_and_verify(dut, header_bytes, target_clz=0):
+    """Starts the miner on the loaded header and verifies the found hash."""
+    yield dut._input_len.storage.eq(len(header_bytes))
+    yield dut._target_clz.storage.eq(target_clz)
+    yield dut._timeout.storage.eq(TIMEOUT_CYCLES)
+    yield
+
+    while not ((yield dut._status.status) & 1): # Idle bit
+        yield
+
+    yield dut._control.storage.eq(1)
+    yield
+
+    verified = False
+    for i in range(TIMEOUT_CYCLES):
+        status = yield dut._status.status
+        if (status >> 3) & 1:
+            print(f"    [FAIL] ✗ Timeout at cycle {i}")
+            break
+        if (status >> 2) & 1:
+            yield # Stabilization
+            verified = yield from verify_hardware_state(dut, header_bytes, target_clz)
+            break
+        yield
+
+    yield dut._control.storage.eq(0)
+    yield; yield
+    return verified
+
+def header_bus_write(dut, word_addr, value, sel=0xFF):
+    """Single Wishbone write to the header window; waits for the ack."""
+    yield dut.header_bus.adr.eq(word_addr)
+    yield dut.header_bus.dat_w.eq(value)
+    yield dut.header_bus.sel.eq(sel)
+    yield dut.header_bus.we.eq(1)
+    yield dut.header_bus.cyc.eq(1)
+    yield dut.header_bus.stb.eq(1)
+    yield
+    while not (yield dut.header_bus.ack):
+        yield
+    yield dut.header_bus.cyc.eq(0)
+    yield dut.header_bus.stb.eq(0)
+    yield dut.header_bus.we.eq(0)
+    yield
+
+def write_header_via_stream(dut, header_bytes, start_word=0):
+    """One _header_addr write, then one _header_data write per word."""
+    yield from dut._header_addr.write(start_word)
+    for start in range(0, len(header_bytes), WORD_BYTES):
+        chunk = bytearray(header_bytes[start:start + WORD_BYTES])
+        chunk += bytearray(WORD_BYTES - len(chunk))
+        yield from dut._header_data.write(int.from_bytes(chunk, 'little'))
+    # Let the registered write land
+    yield; yield
+
+# ==============================================================================
+# Tests
+# ==============================================================================
+
+def test_dma_start_addr_and_header_bus():
+    print("="*70)
+    print("[TEST 1/2/3] with_dma_start_addr, with_header_bus, with_rate_counter")
+    print("="*70)
+
+    dut = SHA3TxPoWController(with_dma_start_addr=True, with_header_bus=True, with_rate_counter=True)
+    ram_storage = bytearray(RAM_SIZE_BYTES)
+    results = {}
+
+    def generator():
+        # ----------------------------------------------------------------------
+        # TEST 1: Partial DMA at _dma_start_addr
+        # ----------------------------------------------------------------------
+        print("\n  [TEST 1] Partial DMA at _dma_start_addr")
+        header = generate_byte_array(300)
+        yield from write_header_via_csr(dut, header)
+        for _ in range(10): yield
+
+        # Rewrite words 20-22 (block 1, bytes 160-183) with new data
+        start_word, num_words = 20, 3
+        new_words = bytes((0xA0 + i) for i in range(num_words * WORD_BYTES))
+        ram_storage[0:len(new_words)] = new_words
+        yield dut._dma_start_addr.storage.eq(start_word)
+        yield
+        yield from perform_dma_transfer(dut, DMA_BASE_ADDR, len(new_words))
+        for _ in range(10): yield
+
+        expected = bytearray(header)
+        expected[start_word * WORD_BYTES:(start_word + num_words) * WORD_BYTES] = new_words
+        mem_ok = yield from check_header_mem(dut, expected, "partial DMA")
+        hash_ok = yield from mine_and_verify(dut, expected)
+        results["dma_start_addr"] = mem_ok and hash_ok
+
+        # ----------------------------------------------------------------------
+        # TEST 2: Header bus (full words, then a partial store)
+        # ----------------------------------------------------------------------
+        print("\n  [TEST 2] Header bus writes")
+        header = generate_byte_array(200)
+        header[100:200] = bytes((i * 7) & 0xFF for i in range(100))
+        for start in range(0, len(header), WORD_BYTES):
+            chunk = bytearray(header[start:start + WORD_BYTES])
+            chunk += bytearray(WORD_BYTES - len(chunk))
+            yield from header_bus_write(dut, start // WORD_BYTES, int.from_bytes(chunk, 'little'))
+        mem_ok = yield from check_header_mem(dut, header, "header bus")
+
+        # sel=0x0F: only the low 4 bytes of word 15 change
+        yield from header_bus_write(dut, 15, 0xFFEEDDCCBBAA9988, sel=0x0F)
+        header[15 * WORD_BYTES:15 * WORD_BYTES + 4] = bytes([0x88, 0x99, 0xAA, 0xBB])
+        sel_ok = yield from check_header_mem(dut, header, "header bus sel=0x0F")
+        hash_ok = yield from mine_and_verify(dut, header)
+        results["header_bus"] = mem_ok and sel_ok and hash_ok
+
+        # ----------------------------------------------------------------------
+        # TEST 3: Rate counter
+        # ----------------------------------------------------------------------
+        print("\n  [TEST 3] Rate counter")
+        # One block takes 24 cycles per attempt and every attempt runs
+        # num_lanes hashes, so a window of 3 attempts reports 3 * num_lanes
+        header = generate_byte_array(100)
+        yield from write_header_via_csr(dut, header)
+        cycles_per_attempt = dut.miner.CYCLES_PER_BLOCK
+        window = 3 * cycles_per_attempt
+        expected_rate = 3 * dut.miner.NUM_LANES
+
+        yield dut._rate_window.storage.eq(window)
+        yield dut._input_len.storage.eq(len(header))
+        yield dut._target_clz.storage.eq(256) # Never found
+        yield dut._timeout.storage.eq(0)
+        yield
+        while not ((yield dut._status.status) & 1):
+            yield
+        yield dut._control.storage.eq(1)
+        yield
+
+        # Skip the window in flight at start, then read two full windows
+        rates = []
+        for _ in range(window * 4):
+            yield
+            rates.append((yield dut._rate_out.status))
+        steady_rates = set(rates[-2 * window:])
+        print(f"    Window: {window} cycles, _rate_out: {sorted(steady_rates)} (expected {expected_rate})")
+
+        rate_ok = steady_rates == {expected_rate}
+        print(f"    {'[PASS] ✓' if rate_ok else '[FAIL] ✗'} Rate counter")
+        results["rate_counter"] = rate_ok
+
+        # Stop the miner
+        yield dut._control.storage.eq(2)
+        yield
+        while not ((yield dut._status.status) & 1):
+            yield
+        yield dut._control.storage.eq(0)
+        yield
+
+    generators = [
+        generator(),
+        dma_memory(dut, ram_storage, DMA_BASE_ADDR)
+    ]
+    run_simulation(dut, generators)
+    return results
+
+def test_header_stream():
+    print("\n" + "="*70)
+    print("[TEST 4] header_stream")
+    print("="*70)
+
+    dut = SHA3TxPoWController(header_stream=True)
+    results = {}
+
+    def generator():
+        header = generate_byte_array(300)
+        yield from write_header_via_stream(dut, header)
+        mem_ok = yield from check_header_mem(dut, header, "stream write")
+
+        # Restart the stream mid-header: words 30-33 only
+        new_words = bytes((0x5A ^ i) for i in range(4 * WORD_BYTES))
+        yield from write_header_via_stream(dut, new_words, start_word=30)
+        header[30 * WORD_BYTES:34 * WORD_BYTES] = new_words
+        restart_ok = yield from check_header_mem(dut, header, "stream restart at word 30")
+
+        hash_ok = yield from mine_and_verify(dut, header)
+        results["header_stream"] = mem_ok and restart_ok and hash_ok
+
+    run_simulation(dut, generator())
+    return results
+
+def test_wide_dma(dma_data_width=256):
+    print("\n" + "="*70)
+    print(f"[TEST 5] dma_data_width={dma_data_width}")
+    print("="*70)
+
+    dut = SHA3TxPoWController(dma_data_width=dma_data_width)
+    beat_bytes = dma_data_width // 8
+    ram_storage = bytearray(RAM_SIZE_BYTES)
+    results = {}
+
+    def load(header):
+        # The DMA length must be a multiple of the bus width
+        length = (len(header) + beat_bytes - 1) // beat_bytes * beat_bytes
+        ram_storage[0:length] = bytes(header) + bytearray(length - len(header))
+        yield from perform_dma_transfer(dut, DMA_BASE_ADDR, length)
+        return length // WORD_BYTES
+
+    def generator():
+        # Part 1: _done is not "header written". Up to fifo_depth beats
+        # (4 words each at 256 bits) are still draining into the header memory.
+        header = generate_byte_array(300)
+        num_words = yield from load(header)
+        pending = num_words - (yield dut.dma_write_addr)
+        print(f"    Words still draining after _done: {pending}")
+        drain_cycles = yield from wait_dma_words(dut, num_words)
+        print(f"    Header written {drain_cycles} cycles after _done")
+        mem_ok = yield from check_header_mem(dut, header, f"{dma_data_width}-bit DMA after drain")
+        hash_ok = yield from mine_and_verify(dut, header)
+        results["wide_dma"] = mem_ok and hash_ok
+
+        # Part 2: start right after _done. The start guard holds the miner
+        # until the last DMA word has landed, so the full header is hashed.
+        header = generate_byte_array(300)
+        header[34:300] = bytes((i * 13 + 5) & 0xFF for i in range(266))
+        yield from load(header)
+        start_ok = yield from mine_and_verify(dut, header)
+        results["wide_dma_start"] = start_ok
+
+    generators = [
+        generator(),
+        dma_memory(dut, ram_storage, DMA_BASE_ADDR, beat_bytes)
+    ]
+    run_simulation(dut, generators)
+    return results
+
+if __name__ == "__main__":
+    results = {}
+    results.update(test_dma_start_addr_and_header_bus())
+    results.update(test_header_stream())
+    results.update(test_wide_dma())
+
+    print("\n" + "="*70)
+    print("Options Summary")
+    print("="*70)
+    for name, passed in results.items():
+        print(f"  {name:<16} {'[PASS] ✓' if passed else '[FAIL] ✗'}")
+    print("="*70)
+    sys.exit(0 if all(results.values()) else 1)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""
+Nonce LFSR polynomial check
+
+Verifies that the stochastic-lane LFSR polynomial in utils.py
+(x^240 + x^16 + x^11 + x + 1) is primitive, i.e. that the LFSR has the
+maximal period 2^240 - 1, and that the lane seeds from nonce_lfsr_seed()
+are 2^232 steps apart on that cycle.
+
+Primitivity test: x has multiplicative order 2^240 - 1 modulo the
+polynomial iff x^(2^240 - 1) = 1 and x^((2^240 - 1) / q) != 1 for every
+prime q dividing 2^240 - 1 (a reducible polynomial cannot reach that
+order). The factorisation of 2^240 - 1 is listed below and re-checked
+here (product and primality).
+
+Run from the repository root: python VerificationTest/check_nonce_lfsr.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import NONCE_LFSR_WIDTH, NONCE_LFSR_TAPS, nonce_lfsr_seed
+
+PERIOD = (1 << NONCE_LFSR_WIDTH) - 1
+
+# 2^240 - 1 = prod(p^e)
+PERIOD_FACTORS = [
+    (3, 2), (5, 2), (7, 1), (11, 1), (13, 1), (17, 1), (31, 1), (41, 1),
+    (61, 1), (97, 1), (151, 1), (241, 1), (257, 1), (331, 1), (673, 1),
+    (1321, 1), (61681, 1), (394783681, 1), (4278255361, 1),
+    (4562284561, 1), (46908728641, 1),
+]
+
+POLY = (1 << NONCE_LFSR_WIDTH) | NONCE_LFSR_TAPS
+
+
+def mulmod(a, b):
+    """Multiply two GF(2) polynomials modulo POLY."""
+    r = 0
+    while b:
+        if b & 1:
+            r ^= a
+        b >>= 1
+        a <<= 1
+        if a >> NONCE_LFSR_WIDTH:
+            a ^= POLY
+    return r
+
+
+def x_pow(e):
+    """x^e modulo POLY."""
+    result, base = 1, 2
+    while e:
+        if e & 1:
+            result = mulmod(result, base)
+        base = mulmod(base, base)
+        e >>= 1
+    return result
+
+
+def is_prime(n):
+    """Miller-Rabin, deterministic for n < 3.3e24 with these bases."""
+    bases = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+    if n < 2:
+        return False
+    for p in bases:
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in bases:
+        x = pow(a, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def main():
+    product = 1
+    for p, e in PERIOD_FACTORS:
+        assert is_prime(p), f"{p} is not prime"
+        product *= p ** e
+    assert product == PERIOD, "factor list does not multiply to 2^240 - 1"
+    print("[OK] 2^240 - 1 factorisation checked")
+    
+    assert x_pow(PERIOD) == 1, "x^(2^240 - 1) != 1"
+    for p, _ in PERIOD_FACTORS:
+        assert x_pow(PERIOD // p) != 1, f"order of x divides (2^240 - 1) / {p}"
+    print("[OK] x^240 + x^16 + x^11 + x + 1 is primitive (period 2^240 - 1)")
+    
+    # Lane i starts at x^(i * 2^232). With at most 256 lanes (lane index in
+    # the top nonce byte) the starts are distinct points of the cycle, each
+    # 2^232 steps after the previous lane's, so streams cannot overlap
+    # before a lane has run 2^232 steps.
+    for lane in range(1, 256):
+        assert nonce_lfsr_seed(lane) == x_pow(lane << 232), f"lane {lane} seed"
+    assert 255 << 232 < PERIOD
+    print("[OK] lane seeds are x^(i * 2^232), i < 256")
+
+
+if __name__ == "__main__":
+    main()
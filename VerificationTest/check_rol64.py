@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""
+rol64 integer path check
+
+Checks utils.rol64 on Python ints (the path used by reference models)
+against a reference rotate on a 64-character bit string: shifts 0, 1 and
+63, a value with high bits set, every shift on a few patterns, and inputs
+wider than 64 bits, which must be masked to 64 bits before rotating.
+
+Run from the repository root: python VerificationTest/check_rol64.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import rol64
+
+MASK64 = (1 << 64) - 1
+
+
+def reference_rol64(value, shift):
+    """Rotate the low 64 bits left as a bit string (MSB first)."""
+    bits = format(value & MASK64, "064b")
+    return int(bits[shift:] + bits[:shift], 2)
+
+
+def main():
+    high_bits = 0xF00000000000000F
+    for shift, expected in [(0, 0xF00000000000000F), (1, 0xE00000000000001F), (63, 0xF800000000000007)]:
+        got = rol64(high_bits, shift)
+        assert got == expected, f"rol64(0x{high_bits:016x}, {shift}) = 0x{got:016x}, expected 0x{expected:016x}"
+        assert got == reference_rol64(high_bits, shift)
+    print("[OK] shifts 0, 1, 63 on a value with the high bits set")
+
+    patterns = [0, 1, 1 << 63, MASK64, 0x0123456789ABCDEF, 0x8000000000000001, 0xDEADBEEFCAFEF00D]
+    for value in patterns:
+        for shift in range(64):
+            assert rol64(value, shift) == reference_rol64(value, shift), f"rol64(0x{value:016x}, {shift})"
+    print("[OK] every shift 0..63 matches the reference rotate")
+
+    # Bits above bit 63 are dropped before rotating, so they never wrap
+    # into the low bits
+    for value in [0x0123456789ABCDEF, 0x8000000000000001]:
+        for extra in [1 << 64, 0xFF << 64, (1 << 200) | (1 << 64)]:
+            for shift in [0, 1, 32, 63]:
+                got = rol64(value | extra, shift)
+                assert got == rol64(value, shift), f"rol64 of a {(value | extra).bit_length()}-bit input, shift {shift}"
+                assert got <= MASK64
+    print("[OK] inputs wider than 64 bits are masked to 64 bits first")
+
+
+if __name__ == "__main__":
+    main()
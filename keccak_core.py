@@ -38,9 +38,13 @@ class KeccakCore(LiteXModule):
         pi_out: Array of 25 x 64-bit signals (after Pi)
         chi_out: Array of 25 x 64-bit signals (after Chi)
         iota_out: Array of 25 x 64-bit signals (after Iota, final output)
+    
+    If pipelined is set, theta_out is registered and the round is split in two
+    half-rounds: step_input -> theta_out on one cycle, theta_out -> iota_out on
+    the next. step_input and round_const must be held for the second half.
     """
     
-    def __init__(self):
+    def __init__(self, pipelined=False):
         # Input state for current step (25 x 64-bit lanes)
         # This is fed from different sources depending on which step we're on
         self.step_input = Array(Signal(64, name=f"keccak_step_in_{i}") for i in range(25))
@@ -66,12 +70,17 @@ class KeccakCore(LiteXModule):
             )
         
         # Theta output: A'[x,y] = A[x,y] ^ D[x]
+        # (registered in pipelined mode: mid-round pipeline stage)
         self.theta_out = Array(Signal(64, name=f"keccak_theta_out_{i}") for i in range(25))
         for y in range(5):
             for x in range(5):
-                self.comb += self.theta_out[x + 5 * y].eq(
+                theta_stmt = self.theta_out[x + 5 * y].eq(
                     self.step_input[x + 5 * y] ^ theta_d[x]
                 )
+                if pipelined:
+                    self.sync += theta_stmt
+                else:
+                    self.comb += theta_stmt
         
         # Rho output: Rotate lanes by fixed offsets
         self.rho_out = Array(Signal(64, name=f"keccak_rho_out_{i}") for i in range(25))
@@ -1,7 +1,10 @@
+import operator
+from functools import reduce
+
 from migen import *
 from litex.gen import *
 
-from utils import KECCAK_ROUND_CONSTANTS
+from utils import KECCAK_ROUND_CONSTANTS, NONCE_LFSR_WIDTH, NONCE_LFSR_TAPS, nonce_lfsr_seed
 from keccak_core import KeccakCore
 from CountLeadingZero.clz_module import CountLeadingZeros
 from FixedIterationStop.fixed_iteration import FixedIterationStop
@@ -13,11 +16,37 @@ class KeccakDatapath(LiteXModule):
     OPTIMIZATION:
     - Implements "Just-In-Time" Padding.
     - Implements "Early Increment" Pre-fetching to resolve multi-block timing violations.
+    - Fuses the block absorb XOR into the first round of each block, so every
+      block costs 24 cycles instead of 25 (no separate ABSORB state).
     - Instead of pre-calculating a massive padded buffer for all blocks,
       it selects the raw block first, then applies padding logic only 
       to the active 1088-bit slice.
+    
+    PARAMETERS:
+    - NUM_LANES: Number of parallel Keccak lanes (SIMD width). Lane 0 runs the
+      linear nonce search, every other lane draws stochastic nonces from its
+      own LFSR. Control, round constants and padding are shared by all lanes.
+    - ROUNDS_PER_CYCLE (K): Number of Keccak rounds computed per clock.
+      K cores are chained combinationally per lane, so a block takes 24/K
+      cycles. Trades area (and Fmax) for latency. Must divide 24 and leave
+      at least 3 cycles per block for the BRAM prefetch (K <= 8).
+    - PIPELINE_DEPTH: 1 = one round per cycle, 2 = each round split into two
+      half-rounds by a register after Theta (PERMUTE / PERMUTE_H2).
+      A block takes 48 cycles but the round cone is roughly halved.
+      Only supported with ROUNDS_PER_CYCLE=1.
+    - TIME_MUX: Share one core chain between all lanes. Lanes take turns
+      (lane_sel) on successive cycles, so a block takes NUM_LANES times as
+      many cycles for roughly 1/NUM_LANES of the core area.
+      Not supported with PIPELINE_DEPTH=2.
+    - FIXED_INPUT_LENGTH: Header length in bytes when it is fixed for the
+      deployment. The block count, pad position and byte masks become
+      elaboration-time constants and only the pad word of the last block
+      keeps any padding logic. input_length is ignored. None = runtime length.
+    - DEBUG_CLZ: Build the per-lane CountLeadingZeros units that drive the
+      clz_N_out debug outputs. They are not used by the difficulty check;
+      with DEBUG_CLZ=False the outputs read 0.
     """
-    def __init__(self, MAX_BLOCKS=16, MAX_DIFFICULTY_BITS=256, NONCE_DATA_FIELD_OVERWRITE_SPACING=2, NONCE_DATA_FIELD_OVERWRITE_SIZE=30, NONCE_FIELD_BYTE_SIZE=34, NONCE_DATA_FIELD_BYTE_SIZE=32, target_attempts=5000000): 
+    def __init__(self, MAX_BLOCKS=16, MAX_DIFFICULTY_BITS=256, NONCE_DATA_FIELD_OVERWRITE_SPACING=2, NONCE_DATA_FIELD_OVERWRITE_SIZE=30, NONCE_FIELD_BYTE_SIZE=34, NONCE_DATA_FIELD_BYTE_SIZE=32, target_attempts=5000000, ROUNDS_PER_CYCLE=1, NUM_LANES=2, PIPELINE_DEPTH=1, TIME_MUX=False, FIXED_INPUT_LENGTH=None, DEBUG_CLZ=True): 
         # --- Constants ---
         self.NONCE_DATA_FIELD_OVERWRITE_SPACING = NONCE_DATA_FIELD_OVERWRITE_SPACING 
         self.NONCE_DATA_FIELD_OVERWRITE_SIZE = NONCE_DATA_FIELD_OVERWRITE_SIZE
@@ -31,18 +60,60 @@ class KeccakDatapath(LiteXModule):
         self.RATE_WORDS = 17
         self.BLOCK_BITS = 1088 # 17 * 64
         self.CAPACITY_BITS = 512
+        self.NUM_ROUNDS = len(KECCAK_ROUND_CONSTANTS) # 24
+        
+        # --- Round Unrolling ---
+        if self.NUM_ROUNDS % ROUNDS_PER_CYCLE != 0:
+            raise ValueError(f"ROUNDS_PER_CYCLE must divide {self.NUM_ROUNDS}, got {ROUNDS_PER_CYCLE}")
+        if self.NUM_ROUNDS // ROUNDS_PER_CYCLE < 3:
+            raise ValueError(f"ROUNDS_PER_CYCLE={ROUNDS_PER_CYCLE} leaves too few cycles per block for the BRAM prefetch")
+        self.ROUNDS_PER_CYCLE = ROUNDS_PER_CYCLE
+        self.ROUND_STEPS = self.NUM_ROUNDS // ROUNDS_PER_CYCLE # Cycles per block
+        
+        # --- Mid-Round Pipelining ---
+        if PIPELINE_DEPTH not in (1, 2):
+            raise ValueError(f"PIPELINE_DEPTH must be 1 or 2, got {PIPELINE_DEPTH}")
+        if PIPELINE_DEPTH > 1 and ROUNDS_PER_CYCLE > 1:
+            raise ValueError("PIPELINE_DEPTH=2 cannot be combined with ROUNDS_PER_CYCLE > 1")
+        self.PIPELINE_DEPTH = PIPELINE_DEPTH
+        
+        # --- SIMD Lanes ---
+        if NUM_LANES < 2:
+            raise ValueError(f"NUM_LANES must be at least 2 (linear + stochastic), got {NUM_LANES}")
+        self.NUM_LANES = NUM_LANES
+        
+        # --- Core Sharing ---
+        if TIME_MUX and PIPELINE_DEPTH > 1:
+            raise ValueError("TIME_MUX cannot be combined with PIPELINE_DEPTH=2")
+        self.TIME_MUX = TIME_MUX
+        
+        # Clock cycles between two absorb rounds (one block)
+        self.CYCLES_PER_BLOCK = self.ROUND_STEPS * PIPELINE_DEPTH * (NUM_LANES if TIME_MUX else 1)
+        
+        # --- Fixed Header Length ---
+        if FIXED_INPUT_LENGTH is not None and not 0 <= FIXED_INPUT_LENGTH < MAX_BLOCKS * 136:
+            raise ValueError(f"FIXED_INPUT_LENGTH must be in 0..{MAX_BLOCKS * 136 - 1}, got {FIXED_INPUT_LENGTH}")
+        self.FIXED_INPUT_LENGTH = FIXED_INPUT_LENGTH
         
         # --- Nonce Signals ---
-        # Initial values: nonce_0 = 1 (linear search), nonce_1 = 0 (stochastic)
-        self.nonce_0 = Signal(self.NONCE_WIDTH_BITS, reset=1)
-        self.nonce_1 = Signal(self.NONCE_WIDTH_BITS, reset=0)
+        # Initial values: nonce_0 = 1 (linear search), nonce_1 = 0 (stochastic).
+        # Further stochastic lanes are salted with their index in the top byte
+        # so no two lanes start from the same nonce.
+        self.nonce_seeds = [1] + [(i - 1) << (self.NONCE_WIDTH_BITS - 8) for i in range(1, NUM_LANES)]
+        self.nonces = [Signal(self.NONCE_WIDTH_BITS, reset=seed, name=f"nonce_{i}") for i, seed in enumerate(self.nonce_seeds)]
+        
+        # Stochastic lanes draw their next nonce from a free-running LFSR
+        # (one per lane, each seeded 2^232 steps apart on the same sequence).
+        # nonce_lfsrs[0] is None: lane 0 counts linearly.
+        self.nonce_lfsrs = [None] + [Signal(NONCE_LFSR_WIDTH, reset=nonce_lfsr_seed(i), name=f"nonce_lfsr_{i}") for i in range(1, NUM_LANES)]
         
         # --- Control Interface ---
         self.start = Signal()
         self.stop = Signal()
         self.running = Signal()
-        self.found = Signal(2)
+        self.found = Signal(NUM_LANES) # One-hot: bit i = lane i found a solution
         self.idle = Signal() 
+        self.debug_enable = Signal() # Capture debug_block0_data (off while mining)
         
         self.timeout_limit = Signal(32, reset=0xFFFFFFFF)
         self.timeout = Signal()
@@ -60,228 +131,370 @@ class KeccakDatapath(LiteXModule):
         # Nonce result is 32 bytes (256 bits) = 30-byte nonce + 2-byte header prefix
         self.nonce_result = Signal(self.NONCE_DATA_FIELD_BYTE_SIZE * 8)
         
-        # Debug: Expose the first 64 bytes of the current block being processed
-        # For Block 0: Shows data with nonce injected (nonce_mask applied)
-        # For subsequent blocks: Shows raw block data (nonce_mask is 0)
-        # Updated every ABSORB cycle to capture all blocks for verification
+        # Debug: Expose the first 64 bytes of block 0 as absorbed (nonce injected)
+        # Updated on the absorb round of block 0 of every attempt, only while
+        # debug_enable is set, so the register does not toggle during mining
         self.debug_block0_data = Signal(512)  # 64 bytes = 512 bits
         
         # --- Internals ---
         self.round_index = Signal(5)
-        self.timeout_counter = Signal(32)
         self.attempts_counter = Signal(64)  # 64-bit counter for hash attempts
-        self.no_cores = 2 # SIMD-2
-        
-        # Completion Status (0=None, 1=Found 0, 2=Found 1, 3=Timeout)
-        self.completion_status = Signal(2)
         
-        # --- FIX: Split Block Logic ---
-        # block_addr: Controls the MUX. Increments EARLY (Cycle 0 of Permute)
-        # loop_counter: Controls the FSM. Increments LATE (Cycle 23 of Permute)
+        # Limits count down to zero from the CSR value loaded on start, so the
+        # result checks are zero tests instead of wide >= compares.
+        self.timeout_left = Signal(32)   # Cycles left before Timeout
+        self.attempts_left = Signal(64)  # Attempts left before NoAttempt
+        timeout_enabled_r = Signal()     # timeout_limit != 0 for this job
+        attempts_enabled_r = Signal()    # attempt_limit != 0 for this job
+        self.no_cores = NUM_LANES # SIMD-N
+        
+        # Completion Status (0=None, 1..N=Found by lane status-1, N+1=Timeout, N+2=NoAttempt)
+        # With the default 2 lanes: 1=Found 0, 2=Found 1, 3=Timeout, 4=NoAttempt
+        self.STATUS_TIMEOUT = NUM_LANES + 1
+        self.STATUS_NO_ATTEMPTS = NUM_LANES + 2
+        self.completion_status = Signal(max=self.STATUS_NO_ATTEMPTS + 1)
+        
+        # block_addr: Controls the MUX and the FSM. Increments EARLY (Cycle 0 of
+        # Permute) and wraps to 0 on the last block, so a non-zero block_addr at
+        # the last round step means another block is still to be absorbed.
         self.block_addr = Signal(max=MAX_BLOCKS)
-        self.loop_counter = Signal(max=MAX_BLOCKS)
         
-        self.total_blocks = Signal(max=MAX_BLOCKS)
+        self.total_blocks = Signal(max=MAX_BLOCKS + 1) # 1..MAX_BLOCKS, latched on start
         
-        self.state_0 = Signal(1600)
-        self.state_1 = Signal(1600)
+        self.states = [Signal(1600, name=f"state_{i}") for i in range(NUM_LANES)]
         
         # --- Instantiate Cores ---
-        self.submodules.core_0 = KeccakCore()
-        self.submodules.core_1 = KeccakCore()
-        
-        round_consts = Array(Constant(k, 64) for k in KECCAK_ROUND_CONSTANTS)
-        self.comb += [
-            self.core_0.round_const.eq(round_consts[self.round_index]),
-            self.core_1.round_const.eq(round_consts[self.round_index]),
-            Cat(*self.core_0.step_input).eq(self.state_0),
-            Cat(*self.core_1.step_input).eq(self.state_1),
-        ]
+        # Each lane gets a chain of ROUNDS_PER_CYCLE cores (core_0 is the head
+        # of lane 0's chain, core_0_1 the next round, ...).
+        # With TIME_MUX a single chain is built and every lane maps onto it.
+        self.core_chains = []
+        for i in range(1 if TIME_MUX else NUM_LANES):
+            chain = []
+            for k in range(self.ROUNDS_PER_CYCLE):
+                suffix = "" if k == 0 else f"_{k}"
+                core = KeccakCore(pipelined=PIPELINE_DEPTH > 1)
+                setattr(self.submodules, f"core_{i}{suffix}", core)
+                chain.append(core)
+            self.core_chains.append(chain)
+        self.lane_cores = self.core_chains * NUM_LANES if TIME_MUX else self.core_chains
+        
+        # Lane currently using the shared chain (TIME_MUX only, stays 0 otherwise)
+        self.lane_sel = Signal(max=NUM_LANES)
+        
+        # Core k of the chain computes round (round_index * K + k).
+        # The round constants are shared by all lanes and held in a small ROM
+        # (one K x 64-bit word per round step) instead of a 64-bit wide LUT mux
+        # per core. The read is synchronous and addressed with the round index
+        # of the NEXT cycle, so the constants come straight from a register.
+        K = self.ROUNDS_PER_CYCLE
+        self.rc_mem = Memory(64 * K, self.ROUND_STEPS, init=[
+            sum(KECCAK_ROUND_CONSTANTS[step * K + k] << (64 * k) for k in range(K))
+            for step in range(self.ROUND_STEPS)
+        ], name="round_constants")
+        self.specials += self.rc_mem
+        rc_port = self.rc_mem.get_port()
+        self.specials += rc_port
+        
+        # round_step: round_index advances this cycle (driven in PERMUTE)
+        round_step = Signal()
+        self.comb += rc_port.adr.eq(
+            Mux(round_step,
+                Mux(self.round_index == self.ROUND_STEPS - 1, 0, self.round_index + 1),
+                self.round_index
+            )
+        )
+        
+        for k in range(K):
+            round_const = Signal(64, name=f"round_const_{k}")
+            self.comb += round_const.eq(rc_port.dat_r[64 * k:64 * (k + 1)])
+            for chain in self.core_chains:
+                self.comb += chain[k].round_const.eq(round_const)
+                if k > 0:
+                    self.comb += Cat(*chain[k].step_input).eq(Cat(*chain[k - 1].iota_out))
+        # Head core inputs are driven by the absorb mux (see FSM section)
+        
+        # Per-lane aliases (state_0, nonce_0, cores_0, ...) for controllers and testbenches
+        for i in range(NUM_LANES):
+            setattr(self, f"state_{i}", self.states[i])
+            setattr(self, f"nonce_{i}", self.nonces[i])
+            setattr(self, f"cores_{i}", self.lane_cores[i])
         # =========================================================================
         # 1. DYNAMIC BLOCK CALCULATOR
         # =========================================================================
         
         # Determine number of blocks based on input length
-        # Simple approach: (len / 136) + 1
-        block_calc_stmt = None
-        for b in range(MAX_BLOCKS):
-            threshold = (b + 1) * 136
-            num_blocks = b + 1
-            if block_calc_stmt is None:
-                block_calc_stmt = If(self.input_length < threshold, self.total_blocks.eq(num_blocks))
-            else:
-                block_calc_stmt = block_calc_stmt.Elif(self.input_length < threshold, self.total_blocks.eq(num_blocks))
-        
-        block_calc_stmt = block_calc_stmt.Else(self.total_blocks.eq(MAX_BLOCKS))
-        self.comb += block_calc_stmt
+        # Simple approach: (len / 136) + 1, capped at MAX_BLOCKS
+        # The thresholds are monotone, so instead of a priority If/Elif chain
+        # all comparators run in parallel and the block count is one plus the
+        # number of thresholds reached.
+        if FIXED_INPUT_LENGTH is None:
+            block_thresholds_reached = [self.input_length >= (b + 1) * 136 for b in range(MAX_BLOCKS - 1)]
+            total_blocks_calc = Signal(max=MAX_BLOCKS + 1)
+            self.comb += total_blocks_calc.eq(reduce(operator.add, block_thresholds_reached, 0) + 1)
+            
+            # Latched on start together with the other per-job constants (see IDLE)
+            block_job_stmts = [NextValue(self.total_blocks, total_blocks_calc)]
+        else:
+            fixed_total_blocks = FIXED_INPUT_LENGTH // 136 + 1
+            self.comb += self.total_blocks.eq(fixed_total_blocks)
+            block_job_stmts = []
 
         # =========================================================================
-        # 2. PIPELINED BLOCK INPUT (BRAM Interface)
+        # 2. BLOCK INPUT (BRAM Interface)
         # =========================================================================
         
         # The Controller now handles the BRAM addressing using 'self.block_addr'.
-        # 'self.header_data' receives the output of the BRAMs (1088 bits).
-        # We simply register this input to cut timing paths between BRAM clock-to-out
-        # and the datapath logic.
-        
-        current_raw_block = Signal(self.BLOCK_BITS)
-        
-        # REGISTER the input (Pipeline Stage)
-        # This gives us a clean cycle for the data to arrive from the BRAM macros.
-        self.sync += current_raw_block.eq(self.header_data)
+        # 'self.header_data' receives the output of the BRAMs (1088 bits), which
+        # is already registered by the synchronous read port. It feeds the
+        # padding and the absorb XOR directly, so only the post-XOR state is
+        # latched. block_addr moves on a whole block ahead of the absorb round,
+        # so the path has many cycles to settle (see add_timing_constraints).
         # =========================================================================
-        # 3. LUT PADDING LOGIC (Stage 2)
+        # 3. PADDING LOGIC (Stage 2)
         # =========================================================================
         
-        # LUT is used due to a Migen Translation bug when using arithmetic shifts.
+        # Byte masks are built structurally (one compare per byte) rather than
+        # with variable shifts, which hit a Migen arithmetic shift bug.
         
-        current_block_padded = Signal(self.BLOCK_BITS)
+        # Padded words are consumed directly by the absorb XOR (no 1088-bit
+        # intermediate padded-block net), see the absorb mux below.
+        padded_words = []
         
         # Padding Parameters
+        # input_length is constant for the whole job, so the pad position and
+        # byte masks are registered once on start (see IDLE) instead of being
+        # re-derived every cycle in front of the per-word logic.
         pad_byte_pos = self.input_length
-        pad_word_global_idx = pad_byte_pos >> 3 # Divide by 8
-        pad_byte_in_word = pad_byte_pos[0:3]    # Mod 8
+        pad_word_idx_r = Signal(len(pad_byte_pos) - 3) # Divide by 8
+        pad_byte_in_word = pad_byte_pos[0:3]           # Mod 8
         
         # Mask to KEEP existing data bytes (Clear bytes that will be overwritten/zeroed)
-        clear_masks = Array([
-            Constant(0x0000000000000000, 64),  # Start @ 0: Keep Nothing
-            Constant(0x00000000000000FF, 64),  # Start @ 1: Keep Byte 0
-            Constant(0x000000000000FFFF, 64),  # Start @ 2: Keep Bytes 0-1
-            Constant(0x0000000000FFFFFF, 64),  # Start @ 3: Keep Bytes 0-2
-            Constant(0x00000000FFFFFFFF, 64),  # Start @ 4: Keep Bytes 0-3
-            Constant(0x000000FFFFFFFFFF, 64),  # Start @ 5: Keep Bytes 0-4
-            Constant(0x0000FFFFFFFFFFFF, 64),  # Start @ 6: Keep Bytes 0-5
-            Constant(0x00FFFFFFFFFFFFFF, 64),  # Start @ 7: Keep Bytes 0-6
-        ])
-        
-        # Mask to ADD the 0x06 suffix
-        set_06_masks = Array([
-            Constant(0x0000000000000006, 64),  # 0x06 @ Byte 0
-            Constant(0x0000000000000600, 64),  # 0x06 @ Byte 1
-            Constant(0x0000000000060000, 64),  # 0x06 @ Byte 2
-            Constant(0x0000000006000000, 64),  # 0x06 @ Byte 3
-            Constant(0x0000000600000000, 64),  # 0x06 @ Byte 4
-            Constant(0x0000060000000000, 64),  # 0x06 @ Byte 5
-            Constant(0x0006000000000000, 64),  # 0x06 @ Byte 6
-            Constant(0x0600000000000000, 64),  # 0x06 @ Byte 7
-        ])
-        
-        # Use Signals with comb assignments to avoid Migen arithmetic shift bug
-        pad_clear_mask = Signal(64)
-        pad_set_06 = Signal(64)
+        # Byte k is kept when it comes before the pad byte.
+        clear_mask = Cat(*[Replicate(pad_byte_in_word > k, 8) for k in range(8)])
+        
+        # Mask to ADD the 0x06 suffix at the pad byte
+        set_06_mask = Cat(*[Mux(pad_byte_in_word == k, Constant(0x06, 8), Constant(0, 8)) for k in range(8)])
+        
+        pad_clear_mask_r = Signal(64)
+        pad_set_06_r = Signal(64)
         pad_set_80 = Signal(64)
         
-        # Use array indexing instead of variable shifts to avoid arithmetic shift bug
-        self.comb += [
-            pad_clear_mask.eq(clear_masks[pad_byte_in_word]),
-            pad_set_06.eq(set_06_masks[pad_byte_in_word]),
-            pad_set_80.eq(Constant(0x8000000000000000, 64)),  # 0x80 at byte 7
-        ]
+        if FIXED_INPUT_LENGTH is None:
+            # Latched into the _r registers on start
+            pad_job_stmts = [
+                NextValue(pad_word_idx_r, pad_byte_pos >> 3),
+                NextValue(pad_clear_mask_r, clear_mask),
+                NextValue(pad_set_06_r, set_06_mask),
+            ]
+        else:
+            fixed_pad_byte = FIXED_INPUT_LENGTH % 8
+            self.comb += [
+                pad_clear_mask_r.eq((1 << (8 * fixed_pad_byte)) - 1),
+                pad_set_06_r.eq(0x06 << (8 * fixed_pad_byte)),
+            ]
+            pad_job_stmts = []
+        self.comb += pad_set_80.eq(Constant(0x8000000000000000, 64))  # 0x80 at byte 7
 
-        # Calculate last word index of the ENTIRE message
-        last_word_of_message_idx = (self.total_blocks * 17) - 1
+        # The last word of the message is always word 16 of the last block
+        is_last_block = Signal()
+        self.comb += is_last_block.eq(self.block_addr == self.total_blocks - 1)
+        
+        # One-Hot Pad Position Decoder
+        # Instead of comparing every word's global index against the pad/end
+        # indices (17 x 3 wide comparators), locate the pad word once relative
+        # to the current block and decode it into 17-bit vectors.
+        # The per-word logic then reduces to a bit-select.
+        # block_word_base (= block_addr * 17) is a register stepped by 17
+        # alongside block_addr in the FSM, so no multiplier is needed.
+        block_word_base = Signal(len(self.block_addr) + 5)
+        
+        # Words strictly after local pad position j: bits (j+1)..16
+        full_word_mask = (1 << self.RATE_WORDS) - 1
+        after_pad_masks = Array(
+            Constant(full_word_mask & ~((1 << (j + 1)) - 1), self.RATE_WORDS) for j in range(self.RATE_WORDS)
+        )
+        
+        pad_word_onehot = Signal(self.RATE_WORDS)
+        after_pad_mask = Signal(self.RATE_WORDS)
+        
+        if FIXED_INPUT_LENGTH is None:
+            local_pad_idx = Signal((32, True))
+            self.comb += local_pad_idx.eq(pad_word_idx_r - block_word_base)
+            
+            pad_before_block = Signal() # Pad word was in an earlier block
+            pad_in_block = Signal()     # Pad word is inside the current block
+            self.comb += [
+                pad_before_block.eq(local_pad_idx < 0),
+                pad_in_block.eq((local_pad_idx >= 0) & (local_pad_idx < self.RATE_WORDS)),
+            ]
+            
+            self.comb += [
+                If(pad_in_block,
+                    Case(local_pad_idx[0:5], {
+                        j: pad_word_onehot.eq(1 << j) for j in range(self.RATE_WORDS)
+                    }),
+                    after_pad_mask.eq(after_pad_masks[local_pad_idx[0:5]])
+                ).Elif(pad_before_block,
+                    pad_word_onehot.eq(0),
+                    after_pad_mask.eq(full_word_mask)
+                ).Else(
+                    pad_word_onehot.eq(0),
+                    after_pad_mask.eq(0)
+                )
+            ]
+        else:
+            # The pad word is always in the last block, at a known word
+            fixed_local_pad_idx = FIXED_INPUT_LENGTH // 8 - (fixed_total_blocks - 1) * self.RATE_WORDS
+            self.comb += [
+                pad_word_onehot.eq(Mux(is_last_block, 1 << fixed_local_pad_idx, 0)),
+                after_pad_mask.eq(Mux(is_last_block, after_pad_masks[fixed_local_pad_idx], 0)),
+            ]
+        
+        # Words that take part in the absorb. Zero-fill words after the pad
+        # word are not XORed at all: the absorb mux passes the state word
+        # straight through for them (see the absorb mux below).
+        # Word 16 of the last block always carries the 0x80.
+        word_active = Signal(self.RATE_WORDS)
+        self.comb += word_active.eq(~after_pad_mask | Cat(Constant(0, self.RATE_WORDS - 1), is_last_block))
 
         # Iterate over the 17 words in the CURRENT block
         for i in range(self.RATE_WORDS):
             
-            # Calculate the Global Index of this word
-            # (Current Block * 17) + i
-            # FIX: Calculate global index based on block_addr
-            global_word_idx = (self.block_addr * 17) + i
-            
-            raw_word = current_raw_block[i*64 : (i+1)*64]
+            raw_word = self.header_data[i*64 : (i+1)*64]
             word_out = Signal(64)
             
-            # Conditions
-            is_pad_start_word = (global_word_idx == pad_word_global_idx)
-            is_msg_end_word   = (global_word_idx == last_word_of_message_idx)
-            is_after_pad      = (global_word_idx > pad_word_global_idx)
+            # Conditions (bit-selects from the decoded vectors)
+            is_pad_start_word = pad_word_onehot[i]
             
-            self.comb += [
-                # Case A: Collision - Padding Start (0x06) and Block End (0x80) in same word
-                If(is_pad_start_word & is_msg_end_word,
-                    word_out.eq((raw_word & pad_clear_mask) | pad_set_06 | pad_set_80)
-                
-                # Case B: Standard Padding Start (0x06)
-                ).Elif(is_pad_start_word,
-                    word_out.eq((raw_word & pad_clear_mask) | pad_set_06)
-                
-                # Case C: Block End (0x80) - only if this is the actual last word of message
-                ).Elif(is_msg_end_word,
-                    word_out.eq(pad_set_80)
-                
-                # Case D: Zero Fill Area (Between 0x06 and 0x80)
-                ).Elif(is_after_pad,
-                    word_out.eq(0)
-                
-                # Case E: Standard Data
-                ).Else(
-                    word_out.eq(raw_word)
-                )
-            ]
+            # Per-byte padding instead of a Case A..E priority chain:
+            # word_out = (raw & keep) | set, with both masks selected independently.
+            # - Pad word: keep the bytes before the pad byte, set 0x06 there.
+            # - Word 16 of the last block: 0x80 at byte 7. Unless it is also the
+            #   pad word it lies after the pad, so none of its raw bytes are kept.
+            # - Zero fill between the two is handled by word_active in the absorb
+            #   mux, those words are never XORed in.
+            if i == self.RATE_WORDS - 1:
+                is_msg_end_word = is_last_block
+                keep_mask = Mux(is_pad_start_word, pad_clear_mask_r, Replicate(~is_msg_end_word, 64))
+                set_mask = Mux(is_pad_start_word, pad_set_06_r, 0) | Mux(is_msg_end_word, pad_set_80, 0)
+            else:
+                keep_mask = Mux(is_pad_start_word, pad_clear_mask_r, Constant((1 << 64) - 1, 64))
+                set_mask = Mux(is_pad_start_word, pad_set_06_r, 0)
+            
+            self.comb += word_out.eq((raw_word & keep_mask) | set_mask)
             
-            self.comb += current_block_padded[i*64 : (i+1)*64].eq(word_out)
+            padded_words.append(word_out)
 
         # =========================================================================
         # 4. FSM
         # =========================================================================
         self.submodules.fsm = FSM(reset_state="IDLE")
         
-        # Extend the 1088-bit Rate slice to full 1600-bit State
-        padded_slice_extended = Signal(1600)
-        self.comb += padded_slice_extended.eq(Cat(current_block_padded, Constant(0, 512)))
+        # Header bytes 2..3 returned ahead of the winning nonce. Latched on
+        # start: by the result check the BRAMs are reading the last block.
+        nonce_prefix_r = Signal(16)
         
-        # Nonce Masks (Only applied to Block 0)
+        # Nonce Words (Only applied to Block 0)
         # FIX: Use Cat() instead of shift to avoid Migen shift translation bug
-        # The nonce is inserted at bit position NONCE_START_BIT (32)
-        nonce_mask_0 = Signal(1600)
-        nonce_mask_1 = Signal(1600)
+        # The nonce is inserted at bit position NONCE_START_BIT (32). Only the
+        # 64-bit words it spans (words 0..4) get a nonce term in the absorb,
+        # instead of XORing a full 1600-bit mask.
         width_mask = Constant((1 << self.NONCE_WIDTH_BITS) - 1, self.NONCE_WIDTH_BITS)
-        
-        # Masked nonce values
-        masked_nonce_0 = Signal(self.NONCE_WIDTH_BITS)
-        masked_nonce_1 = Signal(self.NONCE_WIDTH_BITS)
-        self.comb += [
-            masked_nonce_0.eq(self.nonce_0 & width_mask),
-            masked_nonce_1.eq(self.nonce_1 & width_mask)
-        ]
-
-        # FIX: Check block_addr here. In ABSORB, block_addr is correct (0).
-        self.comb += [
-            If(self.block_addr == 0,
-                nonce_mask_0.eq(Cat(
-                    Constant(0, self.NONCE_START_BIT),
-                    masked_nonce_0,
-                    Constant(0, 1600 - self.NONCE_START_BIT - self.NONCE_WIDTH_BITS)
-                )),
-                nonce_mask_1.eq(Cat(
-                    Constant(0, self.NONCE_START_BIT),
-                    masked_nonce_1,
-                    Constant(0, 1600 - self.NONCE_START_BIT - self.NONCE_WIDTH_BITS)
-                ))
-            ).Else(
-                nonce_mask_0.eq(0),
-                nonce_mask_1.eq(0)
+        nonce_first_word = self.NONCE_START_BIT // 64
+        nonce_last_word = (self.NONCE_START_BIT + self.NONCE_WIDTH_BITS - 1) // 64
+        nonce_span_bits = (nonce_last_word + 1 - nonce_first_word) * 64
+        nonce_words = [] # Per lane: list of 17 entries, Signal(64) or None
+        
+        # FIX: Check block_addr here. In the absorb round, block_addr is correct (0).
+        nonce_in_block = Signal()
+        self.comb += nonce_in_block.eq(self.block_addr == 0)
+        
+        # Absorb Mux: On the first round of every block, the cores see the
+        # block XOR'd into the state combinationally. This replaces the
+        # dedicated ABSORB cycle (state ^= block) with zero added latency.
+        absorb = Signal()
+        
+        # Init Round: the absorb of block 0 starts a fresh hash. The previous
+        # state is masked off at the core input instead of being zeroed in the
+        # FSM, so the state registers are only ever written by the cores.
+        init_round = Signal()
+        self.comb += init_round.eq(absorb & nonce_in_block)
+        
+        # Result Pending: set on the last round step of an attempt. The result
+        # is checked in the first cycle of the next attempt, which absorbs the
+        # next nonces speculatively and only commits them if no exit is taken.
+        # Lane 0's next nonce is pre-registered, so no adder sits on the absorb
+        # path; lane i > 0 takes its LFSR directly.
+        result_pending = Signal()
+        nonce_0_next = Signal(self.NONCE_WIDTH_BITS)
+        self.sync += nonce_0_next.eq(self.nonces[0] + 1)
+        next_nonces = [nonce_0_next] + self.nonce_lfsrs[1:]
+        
+        for i in range(NUM_LANES):
+            masked_nonce = Signal(self.NONCE_WIDTH_BITS, name=f"masked_nonce_{i}")
+            self.comb += masked_nonce.eq(Mux(result_pending, next_nonces[i], self.nonces[i]) & width_mask)
+            
+            nonce_span = Cat(
+                Constant(0, self.NONCE_START_BIT - nonce_first_word * 64),
+                masked_nonce,
+                Constant(0, nonce_span_bits - (self.NONCE_START_BIT - nonce_first_word * 64) - self.NONCE_WIDTH_BITS)
             )
-        ]
+            lane_nonce_words = [None] * self.RATE_WORDS
+            for w in range(nonce_first_word, nonce_last_word + 1):
+                nonce_word = Signal(64, name=f"nonce_word_{i}_{w}")
+                offset = (w - nonce_first_word) * 64
+                self.comb += nonce_word.eq(Mux(nonce_in_block, nonce_span[offset:offset + 64], 0))
+                lane_nonce_words[w] = nonce_word
+            nonce_words.append(lane_nonce_words)
+        
+        # Chain inputs: each chain reads its own lane, or with TIME_MUX the
+        # shared chain reads the state and nonce words of lane_sel.
+        if TIME_MUX:
+            lane_state = Signal(1600, name="lane_sel_state")
+            self.comb += lane_state.eq(Array(self.states)[self.lane_sel])
+            lane_nonce_words = [None] * self.RATE_WORDS
+            for w in range(nonce_first_word, nonce_last_word + 1):
+                lane_nonce_words[w] = Signal(64, name=f"lane_sel_nonce_word_{w}")
+                self.comb += lane_nonce_words[w].eq(Array(nonce_words[i][w] for i in range(NUM_LANES))[self.lane_sel])
+            chain_inputs = [(lane_state, lane_nonce_words)]
+        else:
+            chain_inputs = list(zip(self.states, nonce_words))
+        
+        for chain, (state, chain_nonce_words) in zip(self.core_chains, chain_inputs):
+            # Per-word absorb: rate words are XORed only while word_active,
+            # capacity words always pass the state through.
+            head = chain[0]
+            for w in range(25):
+                state_word = state[w*64 : (w+1)*64] & Replicate(~init_round, 64)
+                if w < self.RATE_WORDS:
+                    absorbed = state_word ^ padded_words[w]
+                    if chain_nonce_words[w] is not None:
+                        absorbed = absorbed ^ chain_nonce_words[w]
+                    self.comb += head.step_input[w].eq(Mux(absorb & word_active[w], absorbed, state_word))
+                else:
+                    self.comb += head.step_input[w].eq(state_word)
+        
+        # First 512 bits of lane 0's block as absorbed (zero-fill words masked,
+        # nonce injected), for the debug capture in PERMUTE.
+        debug_block_words = []
+        for w in range(512 // 64):
+            debug_word = Mux(word_active[w], padded_words[w], 0)
+            if nonce_words[0][w] is not None:
+                debug_word = debug_word ^ nonce_words[0][w]
+            debug_block_words.append(debug_word)
         
         # =========================================================================
         # 5. RESULT EXTRACTION & COMPARISON (CLZ VERSION)
         # =========================================================================
         
-        # Extract the Raw Hash (Bottom 256 bits)
-        raw_hash_0 = self.state_0[0:MAX_DIFFICULTY_BITS]
-        raw_hash_1 = self.state_1[0:MAX_DIFFICULTY_BITS]
-        
-        # Instantiate CLZ modules for both cores
-        self.submodules.clz_0 = CountLeadingZeros(width=MAX_DIFFICULTY_BITS)
-        self.submodules.clz_1 = CountLeadingZeros(width=MAX_DIFFICULTY_BITS)
-        
-        # Connect hash inputs to CLZ modules
-        self.comb += [
-            self.clz_0.i.eq(raw_hash_0),
-            self.clz_1.i.eq(raw_hash_1),
-        ]
+        # Extract the Raw Hash (Bottom 256 bits) and count its leading zeros.
+        # One CLZ module per lane: clz_0, clz_1, ... (debug only, see DEBUG_CLZ)
+        self.clzs = []
+        for i in range(NUM_LANES if DEBUG_CLZ else 0):
+            clz = CountLeadingZeros(width=MAX_DIFFICULTY_BITS)
+            setattr(self.submodules, f"clz_{i}", clz)
+            self.comb += clz.i.eq(self.states[i][0:MAX_DIFFICULTY_BITS])
+            self.clzs.append(clz)
         
         # OPTIONAL: Keep FixedIterationStop for testing (commented out)
         # To use fixed iteration mode instead of real difficulty:
@@ -294,34 +507,53 @@ class KeccakDatapath(LiteXModule):
         #     self.clz_1.iteration.eq(self.iteration_counter),
         # ]
         
-        # Expose CLZ outputs for debug
-        self.clz_0_out = Signal(9)  # 9 bits for 0 to 256
-        self.clz_1_out = Signal(9)  # 9 bits for 0 to 256
-        self.comb += [
-            self.clz_0_out.eq(self.clz_0.o),
-            self.clz_1_out.eq(self.clz_1.o),
+        # Difficulty check without the CLZ on the hit path:
+        # CLZ >= target_clz  <=>  the first target_clz bits (Java order) are zero.
+        # The thermometer mask of those bits is built once per job on start (see IDLE)
+        # in the CLZ's byte-swizzled bit order, so each lane's check is a
+        # 256-bit AND + OR-reduce tree instead of the 8-stage priority encoder
+        # followed by a 9-bit compare.
+        zero_prefix_mask_r = Signal(MAX_DIFFICULTY_BITS)
+        target_reachable_r = Signal() # target_clz <= MAX_DIFFICULTY_BITS
+        zero_prefix_mask = [None] * MAX_DIFFICULTY_BITS
+        for p in range(MAX_DIFFICULTY_BITS):
+            zero_prefix_mask[(p // 8) * 8 + (7 - p % 8)] = self.target_clz > p
+        target_job_stmts = [
+            NextValue(zero_prefix_mask_r, Cat(*zero_prefix_mask)),
+            NextValue(target_reachable_r, self.target_clz <= MAX_DIFFICULTY_BITS),
         ]
         
-        # Preserve signals for debugging
-        self.clz_0_out.attr.add(("keep", "true"))
-        self.clz_1_out.attr.add(("keep", "true"))
+        # Expose CLZ outputs for debug (clz_0_out, clz_1_out, ...)
+        # and the per-lane difficulty check (hash0_lt_target, hash1_lt_target, ...).
+        # The hit flags keep the debug_comparison naming (now CLZ >= target_clz).
+        self.clz_outs = []
+        self.lane_hits = []
+        for i in range(NUM_LANES):
+            clz_out = Signal(9, name=f"clz_{i}_out")  # 9 bits for 0 to 256
+            hit = Signal(name=f"hash{i}_lt_target")
+            if DEBUG_CLZ:
+                self.comb += clz_out.eq(self.clzs[i].o)
+            self.comb += [
+                hit.eq(target_reachable_r & ((self.states[i][0:MAX_DIFFICULTY_BITS] & zero_prefix_mask_r) == 0)),
+            ]
+            # Preserve signals for debugging
+            clz_out.attr.add(("keep", "true"))
+            hit.attr.add(("keep", "true"))
+            setattr(self, f"clz_{i}_out", clz_out)
+            setattr(self, f"hash{i}_lt_target", hit)
+            self.clz_outs.append(clz_out)
+            self.lane_hits.append(hit)
         self.target_clz.attr.add(("keep", "true"))
         
-        # For backward compatibility with debug_comparison register (now CLZ >= target_clz)
-        self.hash0_lt_target = Signal()
-        self.hash1_lt_target = Signal()
-        self.comb += [
-            self.hash0_lt_target.eq(self.clz_0_out >= self.target_clz),
-            self.hash1_lt_target.eq(self.clz_1_out >= self.target_clz)
-        ]
-        self.hash0_lt_target.attr.add(("keep", "true"))
-        self.hash1_lt_target.attr.add(("keep", "true"))
+        # Advance the nonce LFSRs every cycle (Galois form: shift left, fold bit 239 into the taps)
+        for lfsr in self.nonce_lfsrs[1:]:
+            self.sync += lfsr.eq(Cat(0, lfsr[:-1]) ^ (Replicate(lfsr[-1], NONCE_LFSR_WIDTH) & NONCE_LFSR_TAPS))
         
-        # Increment timeout counter every cycle when running (not in IDLE or DONE states)
+        # Decrement the timeout every cycle when running (not in IDLE or DONE states)
         # This ensures timeout is measured in clock cycles, not iterations
         self.sync += [
-            If(self.running,
-                self.timeout_counter.eq(self.timeout_counter + 1)
+            If(self.running & (self.timeout_left != 0),
+                self.timeout_left.eq(self.timeout_left - 1)
             )
         ]
         
@@ -332,22 +564,30 @@ class KeccakDatapath(LiteXModule):
             
             # Optimization: Reset block_addr to 0 in IDLE.
             # This ensures that while we wait for Start, the BRAMs are reading Block 0,
-            # and the pipeline register 'current_raw_block' catches it.
+            # and their read port presents it on header_data.
             # By the time we start, Block 0 is already valid!
             NextValue(self.block_addr, 0),
+            NextValue(block_word_base, 0),
             
             # Only start if the Start signal is asserted
             If(self.start,
                 # Clear status signals when starting new hash
-                NextValue(self.found, 0),
                 NextValue(self.timeout, 0), 
                 NextValue(self.completion_status, 0), # Reset status
-                NextValue(self.timeout_counter, 0),
                 NextValue(self.attempts_counter, 0),  # Reset attempts counter
+                NextValue(self.timeout_left, self.timeout_limit),
+                NextValue(self.attempts_left, self.attempt_limit),
+                NextValue(timeout_enabled_r, self.timeout_limit != 0),
+                NextValue(attempts_enabled_r, self.attempt_limit != 0),
+                NextValue(result_pending, 0),
                 self.timeout.eq(0),
                 self.no_attempts.eq(0),
-                NextValue(self.nonce_0, 1),
-                NextValue(self.nonce_1, 0),
+                [NextValue(nonce, seed) for nonce, seed in zip(self.nonces, self.nonce_seeds)],
+                # Per-job constants (block 0 is already on header_data here)
+                block_job_stmts,
+                pad_job_stmts,
+                target_job_stmts,
+                NextValue(nonce_prefix_r, self.header_data[16:32]),
                 NextState("INIT_HASH")
             )
         )
@@ -355,110 +595,184 @@ class KeccakDatapath(LiteXModule):
         self.fsm.act("INIT_HASH",
             self.running.eq(1),
             self.idle.eq(0),
-            NextValue(self.state_0, 0),
-            NextValue(self.state_1, 0),
-            # block_addr is already 0 from IDLE or CHECK_RESULT
-            NextValue(self.loop_counter, 0),
-            # Direct transition to ABSORB because pipeline is primed
-            NextState("ABSORB") 
-        )
-        
-        self.fsm.act("ABSORB",
-            self.running.eq(1),
-            self.idle.eq(0),
-            NextValue(self.state_0, self.state_0 ^ padded_slice_extended ^ nonce_mask_0),
-            NextValue(self.state_1, self.state_1 ^ padded_slice_extended ^ nonce_mask_1),
             NextValue(self.round_index, 0),
-            # Debug: Capture first 512 bits of current block for every iteration
-            # Block 0: padded_slice_extended ^ nonce_mask_0 (shows nonce injection)
-            # Block 1+: padded_slice_extended (nonce_mask_0 is 0, shows raw data)
-            NextValue(self.debug_block0_data, (padded_slice_extended ^ nonce_mask_0)[0:512]),
-            NextState("PERMUTE")
+            # block_addr is already 0 from IDLE or the wrap in PERMUTE
+            # Direct transition to PERMUTE because pipeline is primed;
+            # Round 0 absorbs the block through the absorb mux.
+            NextState("PERMUTE") 
         )
         
-        self.fsm.act("PERMUTE",
-            self.running.eq(1),
-            self.idle.eq(0),
-            NextValue(self.state_0, Cat(*self.core_0.iota_out)),
-            NextValue(self.state_1, Cat(*self.core_1.iota_out)),
+        # PERMUTE is split into a first half (absorb, prefetch) and a second
+        # half (state update, round advance). With PIPELINE_DEPTH=1 both halves
+        # run in the same cycle; with PIPELINE_DEPTH=2 the second half runs in
+        # PERMUTE_H2, once the cores' registered theta_out is valid.
+        # With TIME_MUX every round step takes one cycle per lane (lane_sel
+        # 0..NUM_LANES-1); otherwise every cycle is both the first and the last turn.
+        if TIME_MUX:
+            first_lane_turn = self.lane_sel == 0
+            last_lane_turn = self.lane_sel == NUM_LANES - 1
+        else:
+            first_lane_turn = last_lane_turn = Constant(1)
+        
+        permute_h1 = [
+            absorb.eq(self.round_index == 0),
             
-            # --- FIX: EARLY INCREMENT LOGIC ---
-            # At Round 0, check if we will need another block later.
-            # If so, increment the address NOW. This gives the MUX 23 cycles 
-            # to switch and settle before we reach ABSORB again.
-            If((self.round_index == 0) & (self.block_addr < self.total_blocks - 1),
-                NextValue(self.block_addr, self.block_addr + 1)
+            # Debug: Capture first 512 bits of block 0 for every attempt
+            # (padded block ^ lane 0 nonce, shows nonce injection)
+            If(self.debug_enable & init_round & first_lane_turn,
+                NextValue(self.debug_block0_data, Cat(*debug_block_words))
             ),
             
-            If(self.round_index == 23,
-                # At Round 23, we use loop_counter to control the flow.
-                If((self.loop_counter + 1) < self.total_blocks,
-                    NextValue(self.loop_counter, self.loop_counter + 1),
-                    NextState("ABSORB") 
+            # --- FIX: EARLY INCREMENT LOGIC ---
+            # At Round 0, check if we will need another block later.
+            # If so, increment the address NOW. This gives the MUX the rest of
+            # the block's cycles to switch and settle before the next block's
+            # absorb round.
+            # On the last block, wrap back to 0 so Block 0 is already valid
+            # when the next attempt starts.
+            # With TIME_MUX, wait for the last lane's turn so every lane
+            # absorbs the same block.
+            If((self.round_index == 0) & last_lane_turn,
+                If(self.block_addr < self.total_blocks - 1,
+                    NextValue(self.block_addr, self.block_addr + 1),
+                    NextValue(block_word_base, block_word_base + self.RATE_WORDS)
                 ).Else(
-                    NextState("CHECK_RESULT")
+                    NextValue(self.block_addr, 0),
+                    NextValue(block_word_base, 0)
                 )
+            ),
+        ]
+        
+        if TIME_MUX:
+            # Only the lane whose turn it is takes the shared chain's output
+            state_update = [If(self.lane_sel == i, NextValue(state, Cat(*self.core_chains[0][-1].iota_out)))
+                for i, state in enumerate(self.states)]
+        else:
+            state_update = [NextValue(state, Cat(*chain[-1].iota_out)) for state, chain in zip(self.states, self.lane_cores)]
+        
+        round_advance = [round_step.eq(1), If(self.round_index == self.ROUND_STEPS - 1,
+            NextValue(self.round_index, 0),
+            # At the last round step, block_addr has already moved on to the
+            # next block, or wrapped to 0 if this was the last one. In that case
+            # the attempt is complete: its result is checked by the next cycle,
+            # which already is the first round of the next attempt.
+            If(self.block_addr == 0,
+                NextValue(result_pending, 1)
+            ),
+            NextState("PERMUTE")
+        ).Else(
+            NextValue(self.round_index, self.round_index + 1),
+            NextState("PERMUTE")
+        )]
+        
+        if TIME_MUX:
+            # Advance the round once every lane has had its turn
+            round_advance = If(last_lane_turn,
+                NextValue(self.lane_sel, 0),
+                round_advance
             ).Else(
-                NextValue(self.round_index, self.round_index + 1),
+                NextValue(self.lane_sel, self.lane_sel + 1),
                 NextState("PERMUTE")
             )
+        
+        permute_h2 = [
+            state_update,
+            round_advance
+        ]
+        
+        # CHECK DIFFICULTY using the CLZ (Count Leading Zeros)
+        # If (CLZ of hash >= required CLZ) then we have a potential solution.
+        # There is no CHECK_RESULT cycle: the first cycle of the next attempt
+        # takes the exit instead of its round if any exit condition holds. The
+        # state is not updated then, so the result hashes stay readable.
+        
+        # Check timeout FIRST (before checking results) to ensure cycle limit is enforced
+        check_stmt = If(timeout_enabled_r & (self.timeout_left == 0),
+            NextValue(self.completion_status, self.STATUS_TIMEOUT),
+            NextState("DONE")
+        # Check attempt limit (NoAttempt)
+        ).Elif(attempts_enabled_r & (self.attempts_left == 0),
+            NextValue(self.completion_status, self.STATUS_NO_ATTEMPTS), # NoAttempt (Exhausted)
+            NextState("DONE")
         )
         
-        self.fsm.act("CHECK_RESULT",
-            self.running.eq(1),
-            self.idle.eq(0),
-            
-            # CHECK DIFFICULTY using the CLZ (Count Leading Zeros)
-            # If (CLZ of hash >= required CLZ) then we have a potential solution.
-            
-            # Check timeout FIRST (before checking results) to ensure cycle limit is enforced
-            If((self.timeout_limit != 0) & (self.timeout_counter >= self.timeout_limit),
-                NextValue(self.completion_status, 3), # Timeout
+        # Lane priority: the lowest lane index wins when several lanes hit
+        for i in range(NUM_LANES):
+            check_stmt = check_stmt.Elif(self.lane_hits[i],
+                NextValue(self.nonce_result, Cat(nonce_prefix_r, self.nonces[i])),
+                NextValue(self.completion_status, i + 1), # Found by lane i
                 NextState("DONE")
-            # Check attempt limit (NoAttempt)
-            ).Elif((self.attempt_limit != 0) & (self.attempts_counter >= self.attempt_limit),
-                NextValue(self.completion_status, 4), # NoAttempt (Exhausted)
-                NextState("DONE")
-            ).Elif(self.clz_0_out >= self.target_clz,
-                NextValue(self.nonce_result, Cat(self.header_data[16:32], self.nonce_0)),
-                NextValue(self.completion_status, 1), # Found 0
-                NextState("DONE") 
-            ).Elif(self.clz_1_out >= self.target_clz,
-                NextValue(self.nonce_result, Cat(self.header_data[16:32], self.nonce_1)),
-                NextValue(self.completion_status, 2), # Found 1
-                NextState("DONE")
-            ).Elif(self.stop,
-                NextState("IDLE")
-            ).Else(
-                NextValue(self.nonce_0, self.nonce_0 + 1),
-                NextValue(self.nonce_1, self.state_0[0:self.NONCE_WIDTH_BITS]), # Stochastic update
-                NextValue(self.attempts_counter, self.attempts_counter + self.no_cores),
-                
-                # When restarting loop, we must reset block_addr to 0.
-                NextValue(self.block_addr, 0),
-                
-                NextState("INIT_HASH")
             )
+        
+        check_stmt = check_stmt.Else(
+            # Stop requested
+            NextState("IDLE")
+        )
+        
+        exit_now = Signal()
+        self.comb += exit_now.eq(result_pending & (
+            (timeout_enabled_r & (self.timeout_left == 0)) |
+            (attempts_enabled_r & (self.attempts_left == 0)) |
+            reduce(operator.or_, self.lane_hits) |
+            self.stop
+        ))
+        
+        # Next attempt: commit the nonces absorbed this cycle and count the attempts
+        # Lane 0: Linear search. Lane i > 0: Stochastic, next value of its LFSR
+        # (no dependency on the permutation output)
+        next_attempt = If(result_pending,
+            NextValue(result_pending, 0),
+            [NextValue(nonce, next_nonce) for nonce, next_nonce in zip(self.nonces, next_nonces)],
+            NextValue(self.attempts_counter, self.attempts_counter + self.no_cores),
+            NextValue(self.attempts_left, Mux(self.attempts_left > self.no_cores, self.attempts_left - self.no_cores, 0)),
         )
         
+        if PIPELINE_DEPTH == 1:
+            self.fsm.act("PERMUTE",
+                self.running.eq(1),
+                self.idle.eq(0),
+                If(exit_now,
+                    check_stmt
+                ).Else(
+                    next_attempt,
+                    permute_h1,
+                    permute_h2
+                )
+            )
+        else:
+            self.fsm.act("PERMUTE",
+                self.running.eq(1),
+                self.idle.eq(0),
+                If(exit_now,
+                    check_stmt
+                ).Else(
+                    next_attempt,
+                    permute_h1,
+                    NextState("PERMUTE_H2")
+                )
+            )
+            
+            # step_input is not needed here: rho..iota read the registered theta_out
+            self.fsm.act("PERMUTE_H2",
+                self.running.eq(1),
+                self.idle.eq(0),
+                permute_h2
+            )
+        
         # --- NEW HANDSHAKE STATE ---
-        # Consolidated state for all completion types (Found 0, Found 1, Timeout, NoAttempt)
+        # Consolidated state for all completion types (Found by lane i, Timeout, NoAttempt)
         # Holds the result signals until software clears 'start'
         
+        # Drive outputs based on the stored completion status
+        done_cases = {i + 1: self.found.eq(1 << i) for i in range(NUM_LANES)} # Found by lane i
+        done_cases[self.STATUS_TIMEOUT] = self.timeout.eq(1)
+        done_cases[self.STATUS_NO_ATTEMPTS] = self.no_attempts.eq(1)
+        
         self.fsm.act("DONE",
             self.running.eq(0),
             self.idle.eq(0),
             
-            # Drive outputs based on the stored completion status
-            If(self.completion_status == 1,      # Found 0
-                self.found.eq(1)
-            ).Elif(self.completion_status == 2,  # Found 1
-                self.found.eq(2)
-            ).Elif(self.completion_status == 3,  # Timeout
-                self.timeout.eq(1)
-            ).Elif(self.completion_status == 4,  # NoAttempt
-                self.no_attempts.eq(1)
-            ),
+            Case(self.completion_status, done_cases),
             
             # Wait for handshake
             If(~self.start, NextState("IDLE"))
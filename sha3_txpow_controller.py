@@ -3,6 +3,7 @@ from litex.gen import *
 from litex.soc.interconnect.csr import *
 from litex.soc.interconnect.csr_eventmanager import EventManager, EventSourcePulse
 from litex.soc.interconnect import wishbone
+from litex.soc.interconnect import stream
 from litex.soc.cores.dma import WishboneDMAReader
 
 import math
@@ -47,8 +48,46 @@ class SHA3TxPoWController(LiteXModule):
     
     FIX: Uses atomic write capture to prevent timing issues where
     the write address increments before the data is consumed.
+    
+    num_lanes: Parallel nonce lanes in the miner (KeccakDatapath NUM_LANES).
+    All lanes share the header memory's read port and search disjoint nonces.
+    rounds_per_cycle: Keccak rounds unrolled per clock in every lane
+    (KeccakDatapath ROUNDS_PER_CYCLE, 1..8).
+    fixed_input_length: Build a miner specialised for one header length in
+    bytes (KeccakDatapath FIXED_INPUT_LENGTH). The input_len CSR is kept
+    for register-map compatibility but ignored. None = generic build.
+    dma_data_width: Width of the DMA Wishbone master (64, 128 or 256).
+    Wider beats are split into 64-bit header words, lowest word first;
+    the DMA length CSR must then be a multiple of dma_data_width/8 bytes.
+    dma _done means every read was issued, not that the header is written:
+    up to 16 FIFO beats (dma_data_width/64 words each) still drain into the
+    header memory, one word per cycle. A start issued meanwhile is held by
+    the header write guard; wait for the drain before the next transfer.
+    with_debug: Build the debug CSRs (_debug_*) and the miner's CLZ units
+    (KeccakDatapath DEBUG_CLZ). Production builds pass False to drop them;
+    the CSRs after them then move, so regenerate csr.h for that build.
+    header_stream: Replace _header_data_low/_header_data_high/_header_we
+    with a single 64-bit _header_data CSR. Each write stores one word at
+    _header_addr and advances the address, so after setting the start
+    address a header loads with one data write per word instead of the
+    address/low/high/we sequence. The CSR map changes; regenerate csr.h.
+    with_dma_start_addr: Add a _dma_start_addr CSR, the header word a DMA
+    transfer starts writing at (0 without it). The header memory keeps its
+    contents between jobs, so a driver can DMA only the words that changed.
+    The CSR map changes; regenerate csr.h.
+    with_rate_counter: Add _rate_window/_rate_out. Every _rate_window clock
+    cycles the attempts made in that window are latched into _rate_out,
+    so software reads the hash rate with a single 32-bit CSR read instead
+    of sampling the 64-bit _attempts_count twice. The CSR map changes;
+    regenerate csr.h.
+    with_header_bus: Add header_bus, a 64-bit Wishbone slave mapping the
+    header words (word address 0-271) for the SoC to add as a memory
+    region. The CPU then loads a header with one 64-bit store per word.
+    sel drives the header memory's byte write enables, so narrower stores
+    only change their own bytes. Reads return 0. DMA and CSR writes take
+    priority; a bus write waits for its ack.
     """
-    def __init__(self, target_attempts=5000000):
+    def __init__(self, target_attempts=5000000, num_lanes=2, rounds_per_cycle=1, fixed_input_length=None, dma_data_width=64, with_debug=True, header_stream=False, with_dma_start_addr=False, with_rate_counter=False, with_header_bus=False):
         # --- CSR Definitions ---
         self._control = CSRStorage(2, description="Control Register [0:Start, 1:Stop]")
         self._status  = CSRStatus(5, description="Status Register [0:Idle, 1:Running, 2:Found, 3:Timeout, 4:NoAttempt]")
@@ -59,17 +98,17 @@ class SHA3TxPoWController(LiteXModule):
         self._target_clz = CSRStorage(9, description="Target Difficulty (CLZ: number of leading zeros, 0-256)")
         
         # Debug CSRs (Solution 2 from EXECUTIVE_SUMMARY)
-        self._debug_hash0 = CSRStatus(MAX_DIFFICULTY_BITS, description="Debug: Hash 0 (raw)")
-        self._debug_hash1 = CSRStatus(MAX_DIFFICULTY_BITS, description="Debug: Hash 1 (raw)")
-        self._debug_clz0 = CSRStatus(9, description="Debug: CLZ of Hash 0 (actual leading zeros)")
-        self._debug_clz1 = CSRStatus(9, description="Debug: CLZ of Hash 1 (actual leading zeros)")
-        self._debug_comparison = CSRStatus(2, description="Debug: comparison results [0:hash0_lt, 1:hash1_lt]")
-        
-        # Debug: Expose first 64 bytes of current block being processed (for verification)
-        # For Block 0: Shows data with nonce injected (nonce area + context)
-        # For subsequent blocks: Shows raw block data to verify correct input
-        # Updated every ABSORB cycle to capture all blocks
-        self._debug_block0_data = CSRStatus(512, description="Debug: Current block first 64 bytes (bits [511:0])")
+        if with_debug:
+            self._debug_hash0 = CSRStatus(MAX_DIFFICULTY_BITS, description="Debug: Hash 0 (raw)")
+            self._debug_hash1 = CSRStatus(MAX_DIFFICULTY_BITS, description="Debug: Hash 1 (raw)")
+            self._debug_clz0 = CSRStatus(9, description="Debug: CLZ of Hash 0 (actual leading zeros)")
+            self._debug_clz1 = CSRStatus(9, description="Debug: CLZ of Hash 1 (actual leading zeros)")
+            self._debug_comparison = CSRStatus(2, description="Debug: comparison results [0:hash0_lt, 1:hash1_lt]")
+            
+            # Debug: Expose first 64 bytes of block 0 (for verification)
+            # Shows data with nonce injected (nonce area + context)
+            # Updated on the absorb round of block 0 while debug_enable is set
+            self._debug_block0_data = CSRStatus(512, description="Debug: Block 0 first 64 bytes (bits [511:0])")
         
         self._timeout = CSRStorage(64, description="Timeout Limit (Clock Cycles). 0=Disable")
         self._attempt_limit = CSRStorage(64, description="Attempt Limit (Iterations). 0=Disable")
@@ -77,22 +116,41 @@ class SHA3TxPoWController(LiteXModule):
         # Input Length for Padding
         self._input_len = CSRStorage(32, description="Length of input header in bytes")
         
-        # Header Data Window - Split into two 32-bit registers for proper endianness
-        # Low 32 bits go to first address, High 32 bits to second address
-        self._header_data_low  = CSRStorage(32, description="Header Data (Low 32)")
-        self._header_data_high = CSRStorage(32, description="Header Data (High 32)")
-        
-        # Combine them (Low bits first, as per little-endian convention)
-        combined_header = Cat(self._header_data_low.storage, self._header_data_high.storage)
+        if header_stream:
+            # Header Data Window - One 64-bit register. Writing it stores the
+            # word at the header address and advances the address, so a
+            # header loads as a stream of data writes after one address write.
+            self._header_data = CSRStorage(WORD_WIDTH, description="Header Data (64-bit word, write stores and advances the address)")
+            combined_header = self._header_data.storage
+        else:
+            # Header Data Window - Split into two 32-bit registers for proper endianness
+            # Low 32 bits go to first address, High 32 bits to second address
+            self._header_data_low  = CSRStorage(32, description="Header Data (Low 32)")
+            self._header_data_high = CSRStorage(32, description="Header Data (High 32)")
+            
+            # Combine them (Low bits first, as per little-endian convention)
+            combined_header = Cat(self._header_data_low.storage, self._header_data_high.storage)
         
         # Dynamic address width calculation
         addr_width = int(math.ceil(math.log2(HEADER_WORDS)))
         self._header_addr = CSRStorage(addr_width, description=f"Header Address (0-{HEADER_WORDS-1})") 
         
-        self._header_we   = CSRStorage(1, description="Header Write Enable")
+        if not header_stream:
+            self._header_we   = CSRStorage(1, description="Header Write Enable")
+        
+        if with_debug:
+            self._debug_enable = CSRStorage(1, description="Debug: Enable debug_block0_data capture")
+        
+        if with_dma_start_addr:
+            self._dma_start_addr = CSRStorage(addr_width, description=f"DMA Header Start Word (0-{HEADER_WORDS-1})")
+        
+        if with_rate_counter:
+            self._rate_window = CSRStorage(24, description="Hash Rate Sample Window (Clock Cycles). 0=Disable")
+            self._rate_out = CSRStatus(32, description="Hash attempts in the last sample window")
         
         # --- Wishbone Master Interface for DMA ---
-        self.bus = wishbone.Interface(data_width=64)
+        # Bursting: header loads are tagged as incrementing-address bursts (see below)
+        self.bus = wishbone.Interface(data_width=dma_data_width, bursting=True)
         
         # Interrupts (Found OR Timeout)
         self.submodules.ev = EventManager()
@@ -103,6 +161,20 @@ class SHA3TxPoWController(LiteXModule):
         # --- Instantiate DMA Reader ---
         self.submodules.dma = WishboneDMAReader(self.bus, fifo_depth=16, with_csr=True)
         
+        # The DMA reads consecutive words, so tag them as one linear
+        # incrementing-address burst: CTI=010 on every beat, CTI=111 (end of
+        # burst) on the last one. Bursting slaves can then return a word per
+        # clock after the first; classic slaves ignore CTI.
+        self.comb += [
+            self.bus.cti.eq(Mux(self.dma.sink.last, 0b111, 0b010)),
+            self.bus.bte.eq(0b00), # Linear
+        ]
+        
+        # Header words are 64 bits: split wider DMA beats into consecutive
+        # words (identity at dma_data_width=64)
+        self.submodules.dma_words = dma_words = stream.Converter(dma_data_width, WORD_WIDTH)
+        self.comb += self.dma.source.connect(dma_words.sink)
+        
         # --- Instantiate Miner ---
         self.submodules.miner = KeccakDatapath(
             MAX_BLOCKS=MAX_BLOCKS,
@@ -111,26 +183,24 @@ class SHA3TxPoWController(LiteXModule):
             NONCE_DATA_FIELD_OVERWRITE_SIZE=MNONCE_DATA_FIELD_OVERWRITE_SIZE,
             NONCE_FIELD_BYTE_SIZE=MNONCE_FIELD_BYTE_SIZE,
             NONCE_DATA_FIELD_BYTE_SIZE=MNONCE_DATA_FIELD_BYTE_SIZE,
-            target_attempts=target_attempts #for testbenches
+            target_attempts=target_attempts, #for testbenches
+            NUM_LANES=num_lanes,
+            ROUNDS_PER_CYCLE=rounds_per_cycle,
+            FIXED_INPUT_LENGTH=fixed_input_length,
+            DEBUG_CLZ=with_debug
         )
         
-        # --- Header Storage (Banked BRAM) ---
-        # Replaces simple Array of Signals with 17 parallel BRAM banks.
-        # Structure: 17 Banks, each 16 words deep (64-bit width)
-        # Total Capacity: 17 * 16 * 8 bytes = 2176 bits (covers 2KB header)
+        # --- Header Storage (Wide BRAM) ---
+        # One memory row per block: 16 rows of 17 x 64-bit words (1088 bits).
+        # Total Capacity: 16 * 136 bytes = 2176 bytes (covers 2KB header)
+        # The miner reads a whole block per cycle; writes go to one 64-bit word
+        # slot of a row through the per-byte write enables (8 per word slot).
+        self.specials.header_mem = header_mem = Memory(width=17 * WORD_WIDTH, depth=16, name="header_mem")
         
-        # Define 17 separate memories
-        self.specials.mem_banks = mem_banks = [Memory(width=64, depth=16, name=f"header_bank_{i}") for i in range(17)]
+        header_write_port = header_mem.get_port(write_capable=True, we_granularity=8, mode=WRITE_FIRST)
+        header_read_port  = header_mem.get_port(write_capable=False, async_read=False) # synchronous read
         
-        # Create Read and Write ports for each bank
-        # We need to access all 17 banks simultaneously for reading (1088-bit read)
-        # We only write to one bank at a time (64-bit write)
-        
-        bank_write_ports = [mem.get_port(write_capable=True, mode="WRITE_FIRST") for mem in mem_banks]
-        bank_read_ports  = [mem.get_port(write_capable=False, async_read=False) for mem in mem_banks] # synchronous read
-        
-        self.specials += bank_write_ports
-        self.specials += bank_read_ports
+        self.specials += header_write_port, header_read_port
 
         # --- Header Storage Write Logic (CSR and DMA) ---
         
@@ -141,152 +211,345 @@ class SHA3TxPoWController(LiteXModule):
         # Track DMA write address (exposed for debugging)
         self.dma_write_addr = dma_write_addr = Signal(addr_width)
         
-        # Detect rising edge of DMA enable to reset the write pointer
+        # Detect rising edge of DMA enable to load the write pointer
         self.dma_enable_d = dma_enable_d = Signal()
         dma_enable_rising = Signal()
         self.sync += dma_enable_d.eq(self.dma._enable.storage)
         self.comb += dma_enable_rising.eq(~dma_enable_d & self.dma._enable.storage)
         
-        # DMA ready signal: always ready when DMA is enabled
-        # The DMA controller handles length checking internally
-        self.comb += self.dma.source.ready.eq(self.dma._enable.storage)
+        # DMA ready signal: the header memory takes a word every cycle, so the
+        # stream is never stalled. The DMA controller handles length checking
+        # internally; words of the last wide beat still drain after done is
+        # reported and the enable is cleared.
+        self.comb += dma_words.source.ready.eq(1)
+        
+        # DMA writes are sequential, so the (slot, row) position is tracked
+        # alongside the linear address instead of being decoded from it.
+        dma_write_slot = Signal(5)
+        dma_write_row = Signal(4)
+        
+        # Start position of a transfer: word 0, or _dma_start_addr decoded to
+        # (slot, row) like the CSR addresses below
+        if with_dma_start_addr:
+            dma_start_addr = self._dma_start_addr.storage
+            dma_start_slot = Signal(5)
+            dma_start_row = Signal(4)
+            dma_start_cases = {addr: [dma_start_slot.eq(addr % 17), dma_start_row.eq(addr // 17)] for addr in range(17 * 16)}
+            dma_start_cases["default"] = [dma_start_slot.eq(31), dma_start_row.eq(0)]
+            self.comb += Case(dma_start_addr, dma_start_cases)
+        else:
+            dma_start_addr = dma_start_slot = dma_start_row = 0
         
         # Update write address on handshake
         self.sync += [
             If(dma_enable_rising,
-                dma_write_addr.eq(0)
-            ).Elif(self.dma.source.valid & self.dma.source.ready,
-                dma_write_addr.eq(dma_write_addr + 1)
+                dma_write_addr.eq(dma_start_addr),
+                dma_write_slot.eq(dma_start_slot),
+                dma_write_row.eq(dma_start_row)
+            ).Elif(dma_words.source.valid & dma_words.source.ready,
+                dma_write_addr.eq(dma_write_addr + 1),
+                # Past the last word the slot parks at 31 (no slot), like the
+                # out-of-range CSR addresses below
+                If(dma_write_slot == 16,
+                    If(dma_write_row == 15,
+                        dma_write_slot.eq(31)
+                    ).Else(
+                        dma_write_slot.eq(0),
+                        dma_write_row.eq(dma_write_row + 1)
+                    )
+                ).Elif(dma_write_slot != 31,
+                    dma_write_slot.eq(dma_write_slot + 1)
+                )
+            )
+        ]
+        
+        # CSR write address and strobe. In stream mode the address is a
+        # pointer loaded from _header_addr and advanced by every data write
+        # (the CSR's re pulses with the new word already in storage).
+        if header_stream:
+            csr_write_addr = Signal(addr_width)
+            csr_write_strobe = self._header_data.re
+            self.sync += [
+                If(self._header_addr.re,
+                    csr_write_addr.eq(self._header_addr.storage)
+                ).Elif(csr_write_strobe,
+                    csr_write_addr.eq(csr_write_addr + 1)
+                )
+            ]
+        else:
+            csr_write_addr = self._header_addr.storage
+            csr_write_strobe = self._header_we.storage
+        
+        # Register the CSR write (address, data, strobe) so the header memory
+        # write mux and address decoder start from flip-flops rather than
+        # from the CSR bus. CSR writes land one cycle later.
+        # DMA has priority on the write port, so the registered write is held
+        # (strobe_r stays set) until a cycle without a DMA beat takes it. In
+        # stream mode re is a one-cycle pulse and would otherwise be lost. One
+        # write is held at a time: software must not issue a second header CSR
+        # write while a DMA transfer is still streaming words.
+        csr_write_addr_r = Signal(addr_width)
+        csr_write_data_r = Signal(WORD_WIDTH)
+        csr_write_strobe_r = Signal()
+        self.sync += [
+            If(csr_write_strobe,
+                csr_write_addr_r.eq(csr_write_addr),
+                csr_write_data_r.eq(combined_header),
+                csr_write_strobe_r.eq(1)
+            ).Elif(~(dma_words.source.valid & dma_words.source.ready),
+                csr_write_strobe_r.eq(0)
             )
         ]
         
+        # Host (CPU) writes: the CSR window, or the Wishbone header window
+        # when the CSR is idle. A bus access is only acked in a cycle where
+        # neither DMA nor the CSR window writes, so it is never dropped.
+        if with_header_bus:
+            self.header_bus = wishbone.Interface(data_width=WORD_WIDTH, adr_width=addr_width)
+            header_bus_access = Signal()
+            header_bus_write = Signal()
+            self.comb += [
+                header_bus_access.eq(self.header_bus.cyc & self.header_bus.stb & ~self.header_bus.ack &
+                    ~(dma_words.source.valid & dma_words.source.ready) & ~csr_write_strobe_r),
+                header_bus_write.eq(header_bus_access & self.header_bus.we),
+                self.header_bus.dat_r.eq(0),
+            ]
+            self.sync += self.header_bus.ack.eq(header_bus_access)
+            
+            host_write_addr = Mux(csr_write_strobe_r, csr_write_addr_r, self.header_bus.adr)
+            host_write_data = Mux(csr_write_strobe_r, csr_write_data_r, self.header_bus.dat_w)
+            host_write_sel = Mux(csr_write_strobe_r, 0xFF, self.header_bus.sel)
+            host_write_strobe = csr_write_strobe_r | header_bus_write
+        else:
+            host_write_addr = csr_write_addr_r
+            host_write_data = csr_write_data_r
+            host_write_sel = 0xFF
+            host_write_strobe = csr_write_strobe_r
+        
+        # Host writes are random access: map the linear address (0..271) to
+        # (Slot = Addr % 17, Row = Addr // 17) with a single shared decoder.
+        # Out-of-range addresses select slot 31, which matches no slot.
+        csr_write_slot = Signal(5)
+        csr_write_row = Signal(4)
+        csr_addr_cases = {addr: [csr_write_slot.eq(addr % 17), csr_write_row.eq(addr // 17)] for addr in range(17 * 16)}
+        csr_addr_cases["default"] = [csr_write_slot.eq(31), csr_write_row.eq(0)]
+        self.comb += Case(host_write_addr, csr_addr_cases)
+        
         # Unified write logic - Determine write address and data based on priority
         # Priority 1: DMA write (immediate, no pipeline delay)
-        # Priority 2: CSR write (Manual) - Use combined_header (Low bits first)
-        write_addr = Signal(addr_width)
+        # Priority 2: Host write (CSR window - combined_header, Low bits first -
+        # or the header bus)
+        write_slot = Signal(5)
+        write_row = Signal(4)
         write_data = Signal(WORD_WIDTH)
+        write_sel = Signal(WORD_BYTES) # Byte enables within the word
         write_enable = Signal()
         
         self.comb += [
             # Determine write address and data based on priority
-            If(self.dma.source.valid & self.dma.source.ready,
-                write_addr.eq(dma_write_addr),
-                write_data.eq(self.dma.source.data),
+            If(dma_words.source.valid & dma_words.source.ready,
+                write_slot.eq(dma_write_slot),
+                write_row.eq(dma_write_row),
+                write_data.eq(dma_words.source.data),
+                write_sel.eq(0xFF),
                 write_enable.eq(1)
-            ).Elif(self._header_we.storage,
-                write_addr.eq(self._header_addr.storage),
-                write_data.eq(combined_header),
+            ).Elif(host_write_strobe,
+                write_slot.eq(csr_write_slot),
+                write_row.eq(csr_write_row),
+                write_data.eq(host_write_data),
+                write_sel.eq(host_write_sel),
                 write_enable.eq(1)
             ).Else(
                 write_enable.eq(0)
             )
         ]
         
-        # Bank Selection Logic for Writes
-        # Map linear address (0..271) to (Bank 0..16, Offset 0..15).
-        # Implementation: Combinatorial decoding because direct modulo/div signals are not synthesizable.
+        # Slot Selection Logic for Writes
+        # The word is replicated across the row; only the selected slot's
+        # byte write enables are set (all 8 except for partial bus stores).
+        self.comb += [
+            header_write_port.adr.eq(write_row),
+            header_write_port.dat_w.eq(Replicate(write_data, 17)),
+            header_write_port.we.eq(Cat(*[Mux(write_enable & (write_slot == k), write_sel, 0) for k in range(17)]))
+        ]
         
-        for k in range(17):
-            # 1. Bank Selection (Addr % 17 == k)
-            # Generate write enable if address matches any global address belonging to this bank.
-            # Addresses for Bank K are: K, K+17, K+34...
-            addresses_for_bank_k = [k + (17 * n) for n in range(16)]
-            
-            is_address_for_bank = 0
-            for addr_val in addresses_for_bank_k:
-                is_address_for_bank = is_address_for_bank | (write_addr == addr_val)
-            
-            bank_is_selected = is_address_for_bank
-            
-            # 2. Offset Selection (Addr // 17)
-            # Map global linear address to local bank offset (0-15).
-            # We use a Case statement to decode the specific row index.
-            bank_addr_cases = {}
-            for row_idx in range(16):
-                global_addr = k + (17 * row_idx)
-                bank_addr_cases[global_addr] = bank_write_ports[k].adr.eq(row_idx)
-                
-            self.comb += Case(write_addr, bank_addr_cases)
-
-            self.comb += [
-                # bank_write_ports[k].adr is set by Case above
-                bank_write_ports[k].dat_w.eq(write_data),
-                bank_write_ports[k].we.eq(write_enable & bank_is_selected)
-            ]
-            
-            # Connect Read Ports
-            # All banks read from the address requested by the miner (block_addr)
-            # The miner controls the address (0 to 15)
-            self.comb += bank_read_ports[k].adr.eq(self.miner.block_addr)
+        # Connect Read Port
+        # The miner controls the address (block_addr, 0 to 15)
+        self.comb += header_read_port.adr.eq(self.miner.block_addr)
         
         # =========================================================================
         
-        # Connect Memory Outputs to Miner Input
-        # We concatenate the output of all 17 banks to form the full block.
-        # Order implies Bank 0 is LSB (Words 0, 17, 34...)
-        
-        self.comb += self.miner.header_data.eq(Cat(*[bank_read_ports[k].dat_r for k in range(17)]))
+        # Connect Memory Output to Miner Input
+        # Word slot k of a row is word k of that block (slot 0 is LSB).
+        self.comb += self.miner.header_data.eq(header_read_port.dat_r)
+        
+        # Header read -> absorb distance (cycles) assumed by the multicycle
+        # constraints (see add_timing_constraints). block_addr moves on at the
+        # end of the last lane turn of a block's absorb round, the read data
+        # arrives one cycle later and is next absorbed at the first lane turn
+        # of the following block, CYCLES_PER_BLOCK - turns cycles after that.
+        absorb_turns = self.miner.NUM_LANES if self.miner.TIME_MUX else 1
+        self.header_read_cycles = self.miner.CYCLES_PER_BLOCK - absorb_turns
+        
+        # Write -> start guard: a header write just before start would reach
+        # the state within a few cycles, inside the multicycle window. Hold
+        # the miner's start until no header word has been written for
+        # header_read_cycles cycles (a few cycles per job, never while mining).
+        # A start request is latched until the miner leaves IDLE, so a short
+        # start pulse inside the window is delayed rather than lost.
+        # Status reports a held start as running, not idle, and masks the
+        # previous job's result bits until the miner clears them on start.
+        header_settled = Signal(reset=1)
+        start_req = Signal()
+        start_any = Signal()
+        start_held = Signal()
+        self.sync += [
+            If(self._control.storage[0],
+                start_req.eq(1)
+            ).Elif(~self.miner.idle,
+                start_req.eq(0)
+            )
+        ]
+        self.comb += [
+            start_any.eq(self._control.storage[0] | start_req),
+            start_held.eq(start_any & self.miner.idle),
+        ]
+        if self.header_read_cycles >= 2:
+            header_quiet = Signal(max=self.header_read_cycles + 1, reset=self.header_read_cycles)
+            self.sync += [
+                If(write_enable,
+                    header_quiet.eq(0)
+                ).Elif(header_quiet != self.header_read_cycles,
+                    header_quiet.eq(header_quiet + 1)
+                )
+            ]
+            self.comb += header_settled.eq(header_quiet == self.header_read_cycles)
         
         # --- Control & Status ---
+        # Completion status decode (1..N = Found by lane, then Timeout, NoAttempt)
+        # Decoded once; the status bits and the interrupt triggers share them
+        found_any = Signal()
+        timeout_now = Signal()
+        no_attempts_now = Signal()
+        self.comb += [
+            found_any.eq((self.miner.completion_status != 0) & (self.miner.completion_status <= self.miner.NUM_LANES)),
+            timeout_now.eq(self.miner.completion_status == self.miner.STATUS_TIMEOUT),
+            no_attempts_now.eq(self.miner.completion_status == self.miner.STATUS_NO_ATTEMPTS),
+        ]
+        
         self.comb += [
             self.miner.target_clz.eq(self._target_clz.storage),
             self.miner.timeout_limit.eq(self._timeout.storage),
             self.miner.attempt_limit.eq(self._attempt_limit.storage),
             self.miner.input_length.eq(self._input_len.storage), 
             
-            self.miner.start.eq(self._control.storage[0]),
+            self.miner.start.eq(start_any & header_settled),
             self.miner.stop.eq(self._control.storage[1]),
             
             # Status Mapping
-            self._status.status[0].eq(self.miner.idle),
-            self._status.status[1].eq(self.miner.running),
-            self._status.status[2].eq((self.miner.completion_status == 1) | (self.miner.completion_status == 2)),
-            self._status.status[3].eq(self.miner.completion_status == 3),
-            self._status.status[4].eq(self.miner.completion_status == 4),
+            self._status.status[0].eq(self.miner.idle & ~start_held),
+            self._status.status[1].eq(self.miner.running | start_held),
+            self._status.status[2].eq(found_any & ~start_held),
+            self._status.status[3].eq(timeout_now & ~start_held),
+            self._status.status[4].eq(no_attempts_now & ~start_held),
             
             # Connect the miner result to the CSR status
             # Nonce result is 32 bytes (256 bits) - read directly from miner.nonce_result
             # The datapath handles concatenation with header_data bytes [2:3]
             self._nonce_result.status.eq(self.miner.nonce_result[0:256]),
             self._attempts_count.status.eq(self.miner.attempts_counter),
-            
-            # Debug CSRs (Solution 2 from EXECUTIVE_SUMMARY)
-            # Expose internal comparison values for debugging
-            # Use raw hash (bottom 256 bits of state) for debug registers
-            self._debug_hash0.status.eq(self.miner.state_0[0:256]),
-            self._debug_hash1.status.eq(self.miner.state_1[0:256]),
-            self._debug_clz0.status.eq(self.miner.clz_0_out),
-            self._debug_clz1.status.eq(self.miner.clz_1_out),
-            self._debug_comparison.status[0].eq(self.miner.hash0_lt_target),
-            self._debug_comparison.status[1].eq(self.miner.hash1_lt_target),
-            
-            # Debug: Expose first 64 bytes of current block data (512 bits)
-            # Block 0: Shows nonce injection (nonce area + context)
-            # Block 1+: Shows raw block data to verify correct input
-            # Updated every ABSORB cycle for all blocks
-            self._debug_block0_data.status.eq(self.miner.debug_block0_data[0:512]),
         ]
         
+        # Without with_debug, miner.debug_enable stays 0 and the capture
+        # register and CLZ units have no sinks left
+        if with_debug:
+            self.comb += [
+                self.miner.debug_enable.eq(self._debug_enable.storage),
+                
+                # Debug CSRs (Solution 2 from EXECUTIVE_SUMMARY)
+                # Expose internal comparison values for debugging
+                # Use raw hash (bottom 256 bits of state) for debug registers
+                self._debug_hash0.status.eq(self.miner.state_0[0:256]),
+                self._debug_hash1.status.eq(self.miner.state_1[0:256]),
+                self._debug_clz0.status.eq(self.miner.clz_0_out),
+                self._debug_clz1.status.eq(self.miner.clz_1_out),
+                self._debug_comparison.status[0].eq(self.miner.hash0_lt_target),
+                self._debug_comparison.status[1].eq(self.miner.hash1_lt_target),
+                
+                # Debug: Expose first 64 bytes of block 0 data (512 bits)
+                # Shows nonce injection (nonce area + context)
+                # Updated on the absorb round of block 0 while debug_enable is set
+                self._debug_block0_data.status.eq(self.miner.debug_block0_data[0:512]),
+            ]
+        
         # --- FIX START ---
         # Create a latch to hold the result hash.
         # With handshake states, self.miner.found is held high until start is cleared,
         # but we latch the hash when found first goes high for stability.
         self.last_hash = Signal(256)
         
-        self.sync += [
-            If(self.miner.completion_status == 1,
-                self.last_hash.eq(self.miner.state_0[0:256])
-            ).Elif(self.miner.completion_status == 2,
-                self.last_hash.eq(self.miner.state_1[0:256])
-            )
-            # No Else: Retain value until next solution is found
-        ]
+        # No default: Retain value until next solution is found
+        self.sync += Case(self.miner.completion_status, {
+            i + 1: self.last_hash.eq(self.miner.states[i][0:256]) for i in range(self.miner.NUM_LANES)
+        })
         
         self.comb += self._hash_result.status.eq(self.last_hash)
         # --- FIX END ---
         
+        # Hash rate sampling: a window counter reloads from _rate_window and
+        # each reload latches the attempts made since the previous one. If the
+        # counter was reset by a new job in between, the window reports the
+        # attempts since the reset.
+        if with_rate_counter:
+            rate_window_left = Signal(24)
+            rate_prev = Signal(64)
+            self.sync += [
+                If(self._rate_window.storage == 0,
+                    rate_window_left.eq(0)
+                ).Elif(rate_window_left == 0,
+                    rate_window_left.eq(self._rate_window.storage - 1),
+                    rate_prev.eq(self.miner.attempts_counter),
+                    If(self.miner.attempts_counter >= rate_prev,
+                        self._rate_out.status.eq(self.miner.attempts_counter - rate_prev)
+                    ).Else(
+                        self._rate_out.status.eq(self.miner.attempts_counter)
+                    )
+                ).Else(
+                    rate_window_left.eq(rate_window_left - 1)
+                )
+            ]
+        
         # Trigger interrupts
         self.comb += [
-            self.ev.found.trigger.eq((self.miner.completion_status == 1) | (self.miner.completion_status == 2)),
-            self.ev.timeout.trigger.eq((self.miner.completion_status == 3) | (self.miner.completion_status == 4))
-        ]
\ No newline at end of file
+            self.ev.found.trigger.eq(found_any),
+            self.ev.timeout.trigger.eq(timeout_now | no_attempts_now)
+        ]
+    
+    def add_timing_constraints(self, platform):
+        """
+        Vivado multicycle constraints for the header BRAM -> absorb paths.
+        
+        The padded block only reaches the first registers after the absorb
+        mux once per block: the lane states, or the head cores' registered
+        theta_out with PIPELINE_DEPTH=2. The read data is stable for
+        header_read_cycles cycles before it is absorbed; with TIME_MUX that
+        is (ROUND_STEPS - 1) * NUM_LANES, not CYCLES_PER_BLOCK - 1, because
+        block_addr only moves on after the last lane's absorb turn.
+        Header writes right before start are covered by the start guard in
+        __init__, which holds start until the header has been quiet that long.
+        Writing the header while mining is not supported.
+        Call from the SoC target after adding the controller.
+        """
+        cycles = self.header_read_cycles
+        if cycles < 2:
+            return
+        if self.miner.PIPELINE_DEPTH > 1:
+            targets = [reg for chain in self.miner.core_chains for reg in chain[0].theta_out]
+        else:
+            targets = self.miner.states
+        for target in targets:
+            for kind, n in [("setup", cycles), ("hold", cycles - 1)]:
+                platform.add_platform_command(
+                    f"set_multicycle_path -{kind} {n} -from [get_cells -hierarchical *header_mem*] -to [get_cells {{target}}_reg*]",
+                    target=target
+                )
\ No newline at end of file
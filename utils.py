@@ -37,10 +37,56 @@ BYTE_MASKS = [
     0xFFFFFFFFFFFFFFFF,  # 8 bytes
 ]
 
+# Stochastic nonce LFSR: Galois form of the primitive polynomial
+# x^240 + x^16 + x^11 + x + 1 (period 2^240 - 1).
+# Primitivity and the lane seed spacing are checked by
+# VerificationTest/check_nonce_lfsr.py.
+# NONCE_LFSR_TAPS holds the low terms XORed in when bit 239 shifts out.
+NONCE_LFSR_WIDTH = 240
+NONCE_LFSR_TAPS = (1 << 16) | (1 << 11) | (1 << 1) | 1
+
 
 def rol64(value, shift):
-    """Rotate left 64-bit value by shift bits."""
+    """Rotate left 64-bit value by shift bits.
+    
+    Accepts a Migen value (the result is sliced to 64 bits) or a Python
+    int (the result is masked to 64 bits), so reference models can share it.
+    The int path is checked by VerificationTest/check_rol64.py.
+    """
+    if isinstance(value, int):
+        value &= (1 << 64) - 1
+        if shift == 0:
+            return value
+        return ((value << shift) | (value >> (64 - shift))) & ((1 << 64) - 1)
     if shift == 0:
         return value
     return ((value << shift) | (value >> (64 - shift)))[:64]
 
+
+def nonce_lfsr_seed(lane):
+    """Nonce LFSR state x^(lane * 2^232) mod the LFSR polynomial.
+    
+    Every lane runs the same sequence; seeding lane i this way places it
+    2^232 steps ahead of lane i-1, so lane streams cannot overlap.
+    """
+    poly = (1 << NONCE_LFSR_WIDTH) | NONCE_LFSR_TAPS
+    
+    def mulmod(a, b):
+        r = 0
+        while b:
+            if b & 1:
+                r ^= a
+            b >>= 1
+            a <<= 1
+            if a >> NONCE_LFSR_WIDTH:
+                a ^= poly
+        return r
+    
+    result, base, exp = 1, 2, lane << 232
+    while exp:
+        if exp & 1:
+            result = mulmod(result, base)
+        base = mulmod(base, base)
+        exp >>= 1
+    return result
+